@@ -1,23 +1,35 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
 
 class EmailOrUsernameModelBackend(ModelBackend):
     """Authenticate with either username or email"""
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
         if username is None or password is None:
             return None
 
-        # Try to fetch the user by username or email (case‑insensitive).
-        try:
-            user = User.objects.get(
-                Q(username__iexact=username) |
-                Q(email__iexact=username)
-            )
-        except User.DoesNotExist:
+        # Case-insensitive match on username or email, compared with LOWER()
+        # on both sides so each side stays on its lower() index (iexact is a
+        # LIKE on SQLite and scans the table)
+        login = Lower(Value(username))
+        matches = list(
+            User.objects.alias(username_lower=Lower('username'), email_lower=Lower('email'))
+            .filter(Q(username_lower=login) | Q(email_lower=login))
+        )
+        # A username match wins over someone else's email; an email shared
+        # by several accounts identifies none of them
+        by_username = [u for u in matches if u.username.lower() == username.lower()]
+        candidates = by_username or matches
+        if len(candidates) != 1:
+            # Hash anyway, so a miss takes as long as a wrong password
+            User().set_password(password)
             return None
+        user = candidates[0]
 
         # Use the default password check
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
-        return None
\ No newline at end of file
+        return None
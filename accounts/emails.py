@@ -0,0 +1,18 @@
+"""
+Emails sent to users. With the outbox as EMAIL_BACKEND, sending one only
+queues it in the current transaction, see outbox/queue.py.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+
+
+def send_welcome_email(user):
+    if not user.email:
+        return
+    send_mail(
+        'Welcome to Viewpost!',
+        f'Hi {user.username},\n\nThanks for signing up to ViewPost! Start sharing your moments.',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        fail_silently=False
+    )
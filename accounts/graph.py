@@ -0,0 +1,170 @@
+"""
+The follow graph: Profile.following edges and what is derived from them.
+
+Edge checks are single lookups on the through table's (from, to) unique
+index, never a load of someone's whole following list. follow() and
+unfollow() also keep the counters and the following timeline in step.
+
+"Who to follow" suggestions are friends of friends, computed in batch by
+compute_follow_suggestions and stored in FollowSuggestion, so pages read
+them with one indexed query. A candidate scores higher the more of the
+people you follow follow them, and more so when those people follow few
+accounts (an Adamic-Adar style weighting). Users with no such candidates
+yet get the most followed accounts instead.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from viewpost import timeline
+from viewpost.counters import bump
+from viewpost.pagination import keyset_page
+from viewpost.utils import chunked
+from .models import FollowSuggestion, Profile
+
+Follow = Profile.following.through
+
+
+def is_following(profile_id, other_id):
+    """Whether `profile_id` follows `other_id`."""
+    return Follow.objects.filter(from_profile_id=profile_id, to_profile_id=other_id).exists()
+
+
+def relationships(profile_id, other_ids):
+    """
+    {other_id: (follows, followed_by)} for each of `other_ids`: whether
+    `profile_id` follows them and whether they follow back, in one query.
+    """
+    edges = set(Follow.objects.filter(
+        Q(from_profile_id=profile_id, to_profile_id__in=other_ids)
+        | Q(from_profile_id__in=other_ids, to_profile_id=profile_id),
+    ).values_list('from_profile_id', 'to_profile_id'))
+    return {other: ((profile_id, other) in edges, (other, profile_id) in edges) for other in other_ids}
+
+
+def relationship(profile_id, other_id):
+    """(follows, followed_by): each direction of the edge between the two, in one query."""
+    return relationships(profile_id, [other_id])[other_id]
+
+
+def is_mutual(profile_id, other_id):
+    return all(relationship(profile_id, other_id))
+
+
+def follow(profile, target):
+    """Make `profile` follow `target`. Returns False if it already did."""
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(from_profile_id=profile.id, to_profile_id=target.id)
+        if created:
+            bump(Profile.objects.filter(id=profile.id), 'following_count')
+            bump(Profile.objects.filter(id=target.id), 'followers_count')
+            timeline.backfill(profile.user, target.user)
+            FollowSuggestion.objects.filter(profile=profile, suggested=target).delete()
+    return created
+
+
+def unfollow(profile, target):
+    """Make `profile` stop following `target`. Returns False if it didn't."""
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(from_profile_id=profile.id, to_profile_id=target.id).delete()
+        if deleted:
+            bump(Profile.objects.filter(id=profile.id), 'following_count', -1)
+            bump(Profile.objects.filter(id=target.id), 'followers_count', -1)
+            timeline.purge(profile.user, target.user)
+    return bool(deleted)
+
+
+def _edge_page(edges, side, viewer, cursor, size):
+    # Newest edges first: the through table's id is the order of following
+    rows, next_cursor = keyset_page(
+        edges.select_related(f'{side}__user'), cursor, size or settings.FOLLOW_LIST_PAGE_SIZE,
+        field='id', tiebreak='id')
+    profiles = [getattr(edge, side) for edge in rows]
+    flags = relationships(viewer.id, [p.id for p in profiles if p.id != viewer.id])
+    for profile in profiles:
+        profile.viewer_follows, profile.follows_viewer = flags.get(profile.id, (False, False))
+    return profiles, next_cursor
+
+
+def followers_page(profile, viewer, cursor=None, size=None):
+    """
+    (profiles, next_cursor) for one page of who follows `profile`, most
+    recent first. Each profile has its user joined and `viewer_follows`
+    / `follows_viewer` set for `viewer`.
+    """
+    return _edge_page(Follow.objects.filter(to_profile=profile), 'from_profile', viewer, cursor, size)
+
+
+def following_page(profile, viewer, cursor=None, size=None):
+    """Like followers_page(), for who `profile` follows."""
+    return _edge_page(Follow.objects.filter(from_profile=profile), 'to_profile', viewer, cursor, size)
+
+
+def suggestions_for(profile, limit=None):
+    """`profile`'s stored suggestions, best first, with each suggested user joined."""
+    rows = FollowSuggestion.objects.filter(profile=profile).select_related('suggested__user')
+    return list(rows[:limit or settings.FOLLOW_SUGGESTIONS_SHOWN])
+
+
+def suggestion_ids(profile, limit=None):
+    """Just the ids suggestions_for() would show, for page ETags."""
+    rows = FollowSuggestion.objects.filter(profile=profile).values_list('suggested_id', 'mutual_count')
+    return list(rows[:limit or settings.FOLLOW_SUGGESTIONS_SHOWN])
+
+
+def _following(profile_ids):
+    """Who each of `profile_ids` follows, as {profile_id: {followee ids}}."""
+    following = defaultdict(set)
+    # Batched to stay under the database's limit on query parameters
+    for batch in chunked(profile_ids, 5000):
+        edges = Follow.objects.filter(from_profile_id__in=batch).values_list('from_profile_id', 'to_profile_id')
+        for source, target in edges.iterator():
+            following[source].add(target)
+    return following
+
+
+def _suggest(profile_id, followees, their_followees, popular, limit):
+    """Top (suggested_id, score, mutual_count) for one profile."""
+    scores = Counter()
+    mutuals = Counter()
+    for followee in followees:
+        out = their_followees.get(followee, ())
+        weight = 1 / math.log(2 + len(out))
+        for candidate in out:
+            scores[candidate] += weight
+            mutuals[candidate] += 1
+    skip = followees | {profile_id}
+    ranked = [(candidate, score) for candidate, score in scores.most_common() if candidate not in skip][:limit]
+    if len(ranked) < limit:
+        # Not enough friends of friends, top up with popular accounts
+        chosen = {candidate for candidate, _ in ranked}
+        extra = [candidate for candidate in popular if candidate not in skip and candidate not in chosen]
+        ranked += [(candidate, 0.0) for candidate in extra[:limit - len(ranked)]]
+    return [(candidate, score, mutuals[candidate]) for candidate, score in ranked]
+
+
+def compute_suggestions(chunk_size=500, limit=None):
+    """
+    Recompute every profile's suggestions, one chunk of profiles per
+    transaction. A generator, yields how many profiles each chunk covered.
+    """
+    limit = limit or settings.FOLLOW_SUGGESTIONS_LIMIT
+    # Enough spares to still fill `limit` after skipping who someone follows
+    popular = list(Profile.objects.order_by('-followers_count', 'id')
+                   .filter(followers_count__gt=0).values_list('id', flat=True)[:limit * 5])
+    profile_ids = Profile.objects.order_by('id').values_list('id', flat=True)
+    for chunk in chunked(profile_ids.iterator(chunk_size=chunk_size), chunk_size):
+        following = _following(chunk)
+        their_followees = _following({f for followees in following.values() for f in followees})
+        rows = [
+            FollowSuggestion(profile_id=profile_id, suggested_id=candidate, score=score, mutual_count=mutual)
+            for profile_id in chunk
+            for candidate, score, mutual in _suggest(profile_id, following[profile_id], their_followees, popular, limit)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(profile_id__in=chunk).delete()
+            FollowSuggestion.objects.bulk_create(rows)
+        yield len(chunk)
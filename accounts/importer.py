@@ -0,0 +1,132 @@
+"""
+Bulk user import, for onboarding a batch of accounts at once (see the
+bulk_import_users command).
+
+Rows are dicts with a username and optionally an email, a plain text
+password (no password means an unusable one), a bio and the usernames
+they follow. Each chunk of rows is one transaction and a handful of
+queries: users and profiles go in with bulk_create, so none of the
+per-row save signals run, and the search index rows are inserted
+directly in one statement. Hashing the passwords, by far the slowest
+part, happens in a process pool.
+
+Follow edges are held back until every user is in, so a row can follow
+someone further down the file.
+"""
+import csv
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from viewpost import timeline
+from viewpost.counters import reconcile_profiles
+from viewpost.utils import chunked
+from .models import Profile
+from .search import index_new_users
+
+Follow = Profile.following.through
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(f, fmt):
+    """
+    Stream rows out of the open file `f`. CSV needs a header row, and its
+    follows column holds space-separated usernames; in JSONL it's a list.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(f):
+            row['follows'] = (row.get('follows') or '').split()
+            yield row
+    else:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                if isinstance(row.get('follows'), str):
+                    row['follows'] = row['follows'].split()
+                yield row
+
+
+def _valid(username):
+    try:
+        UnicodeUsernameValidator()(username)
+    except ValidationError:
+        return False
+    return 0 < len(username) <= User._meta.get_field('username').max_length
+
+
+def import_users(rows, chunk_size=1000, workers=None, follows=None):
+    """
+    Create a user and profile for each of `rows`, a chunk per transaction,
+    and yield (created, skipped) per chunk. Invalid usernames and ones
+    already taken, in any case, are skipped. (username, followed username)
+    pairs for the users created are appended to `follows` when given.
+    """
+    # Workers are fresh processes on some platforms, so they set Django up first
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        for chunk in chunked(rows, chunk_size):
+            seen = set()
+            fresh = []
+            for row in chunk:
+                username = (row.get('username') or '').strip()
+                if _valid(username) and username.lower() not in seen:
+                    seen.add(username.lower())
+                    fresh.append({**row, 'username': username})
+            # Same lower(username) index as logins, see accounts.backends. SQL
+            # LOWER() may only fold ASCII, so exact names are checked as well.
+            taken = User.objects.alias(username_lower=Lower('username')).filter(
+                Q(username_lower__in=seen) | Q(username__in=[row['username'] for row in fresh]))
+            taken = {name.lower() for name in taken.values_list('username', flat=True)}
+            fresh = [row for row in fresh if row['username'].lower() not in taken]
+
+            # Each hash takes a good fraction of a second, so one per task is fine
+            hashes = pool.map(make_password, [row.get('password') or None for row in fresh])
+            users = [User(username=row['username'], email=(row.get('email') or '').strip(), password=password)
+                     for row, password in zip(fresh, hashes)]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                if users and users[0].pk is None:
+                    # Backends that can't return ids from a bulk insert
+                    ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+                    for user in users:
+                        user.pk = ids[user.username]
+                Profile.objects.bulk_create([Profile(user=user, bio=row.get('bio') or '') for user, row in zip(users, fresh)])
+                index_new_users([(user.pk, user.username, row.get('bio') or '') for user, row in zip(users, fresh)])
+            if follows is not None:
+                follows.extend((row['username'], target) for row in fresh for target in row.get('follows') or ())
+            yield len(users), len(chunk) - len(users)
+
+
+def import_follows(edges, chunk_size=1000):
+    """
+    Insert the (username, followed username) pairs in `edges`, a chunk per
+    transaction, and yield how many pairs were applied per chunk. Unknown
+    usernames and self-follows are dropped. No notifications are sent.
+    """
+    for chunk in chunked(edges, chunk_size):
+        names = {name for pair in chunk for name in pair}
+        profiles = {
+            username: (profile_id, user_id, posts)
+            for username, profile_id, user_id, posts in Profile.objects.filter(user__username__in=names)
+            .values_list('user__username', 'id', 'user_id', 'posts_count')
+        }
+        pairs = {(profiles[a], profiles[b]) for a, b in chunk if a in profiles and b in profiles and a != b}
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                [Follow(from_profile_id=a[0], to_profile_id=b[0]) for a, b in pairs], ignore_conflicts=True,
+            )
+            for a, b in pairs:
+                # Fresh accounts have nothing to copy into anyone's timeline
+                if b[2]:
+                    timeline.backfill(User(pk=a[1]), User(pk=b[1]))
+            # Some pairs may have existed already, so count rather than bump
+            reconcile_profiles(Profile.objects.filter(pk__in={p[0] for pair in pairs for p in pair}))
+        yield len(pairs)
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import importer
+
+
+class Command(BaseCommand):
+    help = "Create users and profiles (and who they follow) from a CSV or JSONL file, in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin.")
+        parser.add_argument('--format', choices=importer.FORMATS,
+                            help="Input format (default: from the file extension).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows created per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.05, help="Seconds to pause between chunks.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes hashing passwords.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in importer.FORMATS:
+            raise CommandError("Can't tell the format from the file name, pass --format csv or --format jsonl.")
+        f = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        created = skipped = 0
+        follows = []
+        with f:
+            rows = importer.read_rows(f, fmt)
+            for new, old in importer.import_users(rows, options['chunk_size'], options['workers'], follows):
+                created += new
+                skipped += old
+                self.stdout.write(f"Created {created} users, skipped {skipped}...")
+                time.sleep(options['sleep'])
+        followed = 0
+        for count in importer.import_follows(follows, options['chunk_size']):
+            followed += count
+            self.stdout.write(f"Added {followed} follows...")
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {created} users created, {skipped} skipped, {followed} follows."))
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import graph
+
+
+class Command(BaseCommand):
+    help = "Recompute everyone's \"who to follow\" suggestions. Run it periodically, e.g. nightly from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Profiles computed per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.05, help="Seconds to pause between chunks.")
+        parser.add_argument('--limit', type=int, help="Suggestions kept per user (default: FOLLOW_SUGGESTIONS_LIMIT).")
+
+    def handle(self, *args, **options):
+        done = 0
+        for count in graph.compute_suggestions(options['chunk_size'], options['limit']):
+            done += count
+            self.stdout.write(f"Computed suggestions for {done} users...")
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Done: {done} users."))
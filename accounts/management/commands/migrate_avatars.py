@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from accounts import avatars
+from accounts.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Render content-addressed avatar sizes for profile photos uploaded before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-render profiles that already have avatars.")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(photo='').exclude(photo__isnull=True).order_by('pk')
+        if not options['force']:
+            profiles = profiles.filter(avatar_hash='')
+        rendered = failed = 0
+        for profile in profiles.only('id', 'photo', 'avatar_hash').iterator():
+            try:
+                avatars.generate(profile)
+            except (OSError, ValueError) as exc:
+                # Missing file or something Pillow can't read
+                failed += 1
+                self.stderr.write(f"Profile {profile.pk} ({profile.photo.name}): {exc}")
+            else:
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS(f"Done: {rendered} rendered, {failed} failed."))
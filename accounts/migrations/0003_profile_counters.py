@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    Post = apps.get_model('viewpost', 'Post')
+    Follow = Profile.following.through
+
+    def count_of(queryset, field, outer='pk'):
+        counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts), 0)
+
+    Profile.objects.update(
+        followers_count=count_of(Follow.objects, 'to_profile'),
+        following_count=count_of(Follow.objects, 'from_profile'),
+        posts_count=count_of(Post.objects, 'owner', outer='user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_profile_theme'),
+        ('viewpost', '0018_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_unread(apps, schema_editor):
+    Profile = apps.get_model('accounts', 'Profile')
+    Notification = apps.get_model('notifications', 'Notification')
+    unread = (Notification.objects.filter(recipient=OuterRef('user_id'), read=False)
+              .order_by().values('recipient').annotate(n=Count('*')).values('n'))
+    Profile.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_profile_counters'),
+        ('notifications', '0002_notification_grouping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """The FTS5 mirror only exists on SQLite, see accounts/search.py."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE accounts_user_search USING fts5(username, bio, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        "INSERT INTO accounts_user_search (rowid, username, bio) "
+        "SELECT u.id, u.username, COALESCE(p.bio, '') FROM auth_user u "
+        "LEFT JOIN accounts_profile p ON p.user_id = u.id"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS accounts_user_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_profile_unread_notifications'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+        # Username autocomplete, see accounts.search.autocomplete()
+        migrations.RunSQL(
+            'CREATE INDEX accounts_user_username_lower_idx ON auth_user (LOWER(username))',
+            'DROP INDEX accounts_user_username_lower_idx',
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_profile_avatar_hash'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        # Login by email, see accounts.backends. Login by username uses
+        # accounts_user_username_lower_idx from 0005.
+        migrations.RunSQL(
+            'CREATE INDEX accounts_user_email_lower_idx ON auth_user (LOWER(email))',
+            'DROP INDEX accounts_user_email_lower_idx',
+        ),
+    ]
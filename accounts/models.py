@@ -2,23 +2,60 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.core.files.storage import default_storage
+from . import avatars
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio =  models.TextField(blank=True)
     photo = models.ImageField(upload_to='profile_photos/', blank=True, null=True)
+    # Content hash naming the resized copies of the photo, see accounts/avatars.py
+    avatar_hash = models.CharField(max_length=64, blank=True, editable=False)
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
     # For dark or light mode
     THEME_CHOICES = [('light', 'Light'), ('dark', 'Dark')]
     theme = models.CharField(max_length=5, choices=THEME_CHOICES, default='light')
+    # Kept in step by the views, see viewpost/counters.py
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    # Fallback for the cached badge count, see notifications/unread.py
+    unread_notifications = models.PositiveIntegerField(default=0)
     
     
     def __str__(self):
         return f"{self.user.username}'s profile"
+
+    @property
+    def avatar_urls(self):
+        """URL of each rendered avatar size, keyed by size as a string. None until rendered."""
+        if not self.avatar_hash:
+            return None
+        return {str(size): default_storage.url(avatars.avatar_name(self.avatar_hash, size)) for size in avatars.SIZES}
     
-# Automatically create/update Profile when User is created:
+# Automatically create a Profile when a User is created. Later saves
+# (the last_login update on every login...) leave it alone.
 @receiver(post_save, sender=User)
-def create_or_update_profile(sender, instance, **kwargs):
-    # Ensure a Profile exists for this user, then save it.
-    profile, _ = Profile.objects.get_or_create(user=instance)
-    profile.save()
\ No newline at end of file
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+class FollowSuggestion(models.Model):
+    """
+    Someone `profile` might want to follow, from compute_follow_suggestions
+    (see accounts/graph.py). Rows are replaced wholesale on every run.
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='follow_suggestions', db_index=False)
+    suggested = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    # How many people `profile` follows already follow `suggested`
+    mutual_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-score', 'id']
+        constraints = [models.UniqueConstraint(fields=['profile', 'suggested'], name='unique_follow_suggestion')]
+        indexes = [models.Index(fields=['profile', '-score', 'id'], name='follow_suggestion_idx')]
+
+    def __str__(self):
+        return f"{self.profile_id} -> {self.suggested_id} ({self.score:.2f})"
@@ -0,0 +1,94 @@
+"""
+User search.
+
+On SQLite, every user's username and bio are mirrored into an FTS5 table
+using the trigram tokenizer, so substring queries hit an index instead of
+scanning auth_user. The receivers at the bottom keep the mirror in step.
+Other databases fall back to a limited icontains query.
+
+Autocomplete is a plain range over the lower(username) index created in
+migration 0005, cheap enough to run on every keystroke.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from viewpost.fts import fts_enabled, index_row, insert_rows, ranked_page, unindex_row
+from viewpost.pagination import keyset_page
+from .models import Profile
+
+TABLE = 'accounts_user_search'
+# bm25() weights per column: a username hit counts far more than a bio hit
+WEIGHTS = (10.0, 1.0)
+# The trigram tokenizer can't match anything shorter than this
+MIN_MATCH_LENGTH = 3
+
+
+def index_user(user_id, username, bio):
+    index_row(TABLE, user_id, username=username, bio=bio)
+
+
+def index_new_users(rows):
+    """Index (user_id, username, bio) `rows` for users created in bulk, in one statement."""
+    insert_rows(TABLE, ('username', 'bio'), rows)
+
+
+def unindex_user(user_id):
+    unindex_row(TABLE, user_id)
+
+
+def search(query, cursor=None, size=None):
+    """
+    (users, next_cursor) for one page of users matching `query`, best
+    match first, each with its profile already joined.
+    """
+    size = size or settings.USER_SEARCH_PAGE_SIZE
+    if len(query) < MIN_MATCH_LENGTH:
+        # Too short to match trigrams, a username prefix is the best we can do
+        return autocomplete(query, size), None
+    if not fts_enabled():
+        users = User.objects.filter(username__icontains=query).select_related('profile')
+        return keyset_page(users, cursor, size, field='username', descending=False)
+
+    ids, next_cursor = ranked_page(TABLE, query, User, cursor, size, WEIGHTS)
+    found = User.objects.select_related('profile').in_bulk(ids)
+    return [found[user_id] for user_id in ids if user_id in found], next_cursor
+
+
+def autocomplete(prefix, limit=None):
+    """Up to `limit` users whose username starts with `prefix`, alphabetically."""
+    prefix = prefix.lower()
+    if not prefix:
+        return []
+    # A range rather than LIKE, so it stays on the lower(username) index
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    users = (User.objects.annotate(username_lower=Lower('username'))
+             .filter(username_lower__gte=prefix, username_lower__lt=upper)
+             .select_related('profile').order_by('username_lower'))
+    return list(users[:limit or settings.USER_AUTOCOMPLETE_LIMIT])
+
+
+@receiver(post_save, sender=Profile)
+def index_profile(sender, instance, update_fields=None, **kwargs):
+    # Counter bumps and theme changes don't touch what we index
+    if update_fields and 'bio' not in update_fields:
+        return
+    index_user(instance.user_id, instance.user.username, instance.bio)
+
+
+@receiver(post_save, sender=User)
+def index_renamed_user(sender, instance, created, update_fields=None, **kwargs):
+    # A new user is indexed along with their new profile, and saves like
+    # the last_login update can't have changed the username
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    bio = Profile.objects.filter(user=instance).values_list('bio', flat=True).first()
+    if bio is not None:
+        index_user(instance.pk, instance.username, bio)
+
+
+@receiver(post_delete, sender=User)
+def unindex_deleted_user(sender, instance, **kwargs):
+    unindex_user(instance.pk)
@@ -0,0 +1,10 @@
+from jobqueue.queue import task
+from . import avatars
+from .models import Profile
+
+
+@task('accounts.render_avatar')
+def render_avatar(profile_id):
+    profile = Profile.objects.filter(id=profile_id).first()
+    if profile is not None:
+        avatars.generate(profile)
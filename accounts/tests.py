@@ -1,3 +1,177 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from PIL import Image
+
+from jobqueue.models import Job
+from viewpost.counters import bump
+from viewpost.models import Post, TimelineEntry
+from viewpost.pagination import encode_cursor
+from viewpost.tests import QueryPlanAssertions
+from . import graph, importer, search
+from .models import Profile
+
+
+class LoginTests(QueryPlanAssertions, TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('Author', 'Author@Example.com', 'pw')
+
+    def test_any_case(self):
+        for login in ('author', 'AUTHOR', 'author@example.com', 'AUTHOR@EXAMPLE.COM'):
+            self.assertEqual(authenticate(username=login, password='pw'), self.author)
+        self.assertIsNone(authenticate(username='author', password='PW'))
+
+    def test_username_beats_email(self):
+        # Someone whose email is another account's username
+        other = User.objects.create_user('other', 'author', 'secret')
+        self.assertEqual(authenticate(username='author', password='pw'), self.author)
+        self.assertIsNone(authenticate(username='author', password='secret'))
+        self.assertEqual(authenticate(username='other', password='secret'), other)
+
+    def test_shared_email(self):
+        User.objects.create_user('twin', 'author@example.com', 'pw')
+        self.assertIsNone(authenticate(username='author@example.com', password='pw'))
+        self.assertEqual(authenticate(username='twin', password='pw').username, 'twin')
+
+    @skipUnless(connection.vendor == 'sqlite', "Reads SQLite's EXPLAIN QUERY PLAN output")
+    def test_query_plan(self):
+        # One query for the username or email, on their lower() indexes
+        for login in ('AUTHOR', 'Author@Example.com', 'nobody'):
+            with CaptureQueriesContext(connection) as ctx:
+                authenticate(username=login, password='wrong')
+            self.assertEqual(len(ctx.captured_queries), 1)
+            self.assertIndexed(ctx.captured_queries[0]['sql'])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Uses the SQLite FTS5 tables")
+class SearchTests(QueryPlanAssertions, TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', 'author@example.com', 'pw')
+
+    def test_user_autocomplete(self):
+        self.assertPageIndexed(self.user, '/accounts/search/autocomplete/', {'q': 'Au'})
+
+    def test_autocomplete_avatar(self):
+        self.client.force_login(self.user)
+        profile = self.user.profile
+        url = '/accounts/search/autocomplete/'
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'], [{'username': 'author', 'photo': None}])
+        profile.photo = 'profile_photos/me.png'
+        profile.save()
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'][0]['photo'], '/media/profile_photos/me.png')
+        profile.avatar_hash = 'a' * 64
+        profile.save()
+        self.assertEqual(self.client.get(url, {'q': 'au'}).json()['results'][0]['photo'], profile.avatar_urls['32'])
+
+    def test_tampered_cursor(self):
+        # Treated as no cursor at all, the first page
+        self.client.force_login(self.user)
+        for cursor in (encode_cursor([1], 2), encode_cursor(-1.5, 'x'), encode_cursor(True, 2), 'junk'):
+            for url in ('/accounts/search/', '/search/'):
+                response = self.client.get(url, {'q': 'author', 'after': cursor})
+                self.assertEqual(response.status_code, 200)
+
+
+class EditProfileTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def test_new_photo_drops_old_avatars(self):
+        self.user.profile.avatar_hash = 'old'
+        self.user.profile.save()
+        png = io.BytesIO()
+        Image.new('RGB', (8, 8)).save(png, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/accounts/profile/edit/', {
+                'username': 'author', 'bio': '', 'photo': SimpleUploadedFile('me.png', png.getvalue(), 'image/png'),
+            })
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.photo)
+        self.assertEqual(self.user.profile.avatar_hash, '')
+        self.assertTrue(Job.objects.filter(name='accounts.render_avatar').exists())
+
+
+class ImportTests(TestCase):
+
+    def run_import(self, rows, chunk_size=1000):
+        follows = []
+        counts = list(importer.import_users(rows, chunk_size, workers=1, follows=follows))
+        followed = sum(importer.import_follows(follows, chunk_size))
+        return counts, followed
+
+    def test_read_rows(self):
+        csv = io.StringIO('username,email,bio,follows\nann,ann@example.com,Hi,bob carl\nbob,,,\n')
+        rows = list(importer.read_rows(csv, 'csv'))
+        self.assertEqual([(r['username'], r['follows']) for r in rows], [('ann', ['bob', 'carl']), ('bob', [])])
+        jsonl = io.StringIO('{"username": "ann", "follows": ["bob"]}\n\n{"username": "bob", "follows": "ann carl"}\n')
+        rows = list(importer.read_rows(jsonl, 'jsonl'))
+        self.assertEqual([r['follows'] for r in rows], [['bob'], ['ann', 'carl']])
+
+    def test_case_clashes(self):
+        User.objects.create_user('Taken', 'taken@example.com', 'pw')
+        rows = [{'username': 'ann'}, {'username': 'ANN'}, {'username': 'taken'}, {'username': 'bob'},
+                {'username': 'Bob'}, {'username': 'not valid!'}]
+        counts, _ = self.run_import(rows, chunk_size=3)
+        self.assertEqual(counts, [(1, 2), (1, 2)])
+        # Across chunks too: Bob's chunk comes after bob's
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)), ['Taken', 'ann', 'bob'])
+        self.assertEqual(Profile.objects.count(), 3)
+
+    def test_follows(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(owner=author, content='hello')
+        bump(Profile.objects.filter(user=author), 'posts_count')
+        rows = [
+            # Followed before they're created, further down the file
+            {'username': 'ann', 'follows': ['bob', 'author', 'nobody', 'ann']},
+            {'username': 'bob', 'follows': ['ann']},
+        ]
+        _, followed = self.run_import(rows, chunk_size=1)
+        self.assertEqual(followed, 3)
+        ann, bob, author = (Profile.objects.get(user__username=name) for name in ('ann', 'bob', 'author'))
+        self.assertEqual((ann.following_count, ann.followers_count), (2, 1))
+        self.assertEqual((bob.following_count, bob.followers_count), (1, 1))
+        self.assertEqual(author.followers_count, 1)
+        self.assertTrue(graph.is_mutual(ann.id, bob.id))
+        self.assertEqual(list(TimelineEntry.objects.values_list('user__username', flat=True)), ['ann'])
+        # Importing the same edges again changes nothing
+        self.assertEqual(sum(importer.import_follows([('ann', 'bob')])), 1)
+        ann.refresh_from_db()
+        self.assertEqual(ann.following_count, 2)
+
+    def test_profile_signal(self):
+        # Only created users get a profile made, later saves run no extra queries
+        user = User.objects.create_user('ann', 'ann@example.com', 'pw')
+        self.assertTrue(Profile.objects.filter(user=user).exists())
+        with CaptureQueriesContext(connection) as ctx:
+            user.save(update_fields=['last_login'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        Profile.objects.filter(user=user).delete()
+        user.save()
+        self.assertFalse(Profile.objects.filter(user=user).exists())
+
+    def test_chunk_queries(self):
+        # A handful per chunk, however many rows it holds
+        rows = [{'username': f'user{i}', 'bio': f'bio {i}'} for i in range(200)]
+        with CaptureQueriesContext(connection) as ctx:
+            for created, skipped in importer.import_users(rows, chunk_size=200, workers=1):
+                self.assertEqual((created, skipped), (200, 0))
+        self.assertLess(len(ctx.captured_queries), 10)
+        self.assertEqual([u.username for u in search.search('user123')[0]], ['user123'])
@@ -13,6 +13,7 @@ urlpatterns = [
     
     # search user url
     path('search/', views.search_users, name='search_users'),
+    path('search/autocomplete/', views.autocomplete_users, name='autocomplete_users'),
 
     # Profile urls
     path('profile/edit/', views.edit_profile, name='edit_profile'),
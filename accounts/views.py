@@ -4,13 +4,23 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
 from .models import Profile
 from .forms import UserProfileForm, RegistrationForm, ConfirmPasswordForm, EmailChangeForm, ThemeForm
-from viewpost.models import Post
-from django.core.mail import send_mail
-from django.conf import settings
-from django.contrib.auth.models import User
+from viewpost.models import Comment, Post
+from viewpost import cards
+from viewpost.conditional import page_etag
+from . import graph, search
+from viewpost.counters import reconcile_comments, reconcile_posts, reconcile_profiles
+from django.db import transaction
+from django.db.models import Q
 from django.contrib import messages
 from notifications.models import Notification
+from notifications.tasks import notify_later
+from jobqueue.queue import enqueue
+from .emails import send_welcome_email
 from django.contrib.contenttypes.models import ContentType
+from django.http import JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 def register(request):
     """Register a new user, log them in, send them welcome email"""
@@ -18,14 +28,10 @@ def register(request):
         form = RegistrationForm(request.POST, request.FILES)
         if form.is_valid():
             user = form.save()
-            # Send welcome email
-            send_mail(
-                'Welcome to Viewpost!', 
-                f'Hi {user.username},\n\nThanks for signing up to ViewPost! Start sharing your moments.',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False
-            )
+            # Only queues it in the outbox, send_outbox delivers it in a batch
+            send_welcome_email(user)
+            if user.profile.photo:
+                enqueue('accounts.render_avatar', profile_id=user.profile.id)
             # a "success" message when sucessfully registered
             messages.success(request, "You've Successfully registered! Please log in to continue")
             # login(request, user)
@@ -36,25 +42,42 @@ def register(request):
         form = RegistrationForm()
     return render(request, 'registration/register.html', {'form': form})
 
+def _profile_etag(request, username):
+    profile = Profile.objects.filter(user__username=username).values(
+        'id', 'user_id', 'bio', 'photo', 'avatar_hash',
+        'posts_count', 'following_count', 'followers_count').first()
+    if profile is None:
+        return None
+    me = request.user.profile
+    relationship = graph.relationship(me.id, profile['id'])
+    suggestions = graph.suggestion_ids(me) if me.id == profile['id'] else ()
+    posts = Post.objects.for_etag().filter(owner_id=profile['user_id'])
+    return page_etag(request, username, *profile.values(), *relationship, *suggestions,
+                     cards.watermark(posts, request.user))
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_profile_etag)
 def view_profile(request, username):
     """Show a user's profile, their posts, and follow counts."""
     # Look up the user profile
     user = get_object_or_404(Profile, user__username = username).user
     profile = user.profile
-    # Get the user's posts and counts
-    posts = Post.objects.filter(owner=user)
-    posts_count = posts.count()
-    # Get follow counts
-    following_count = profile.following.count()
-    followers_count = profile.followers.count()
+    me = request.user.profile
+    # Get the user's posts, counts are stored on the profile
+    posts = Post.objects.for_feed(request.user).filter(owner=user)
+    is_following, follows_you = graph.relationship(me.id, profile.id)
     
     context = {
         'profile': profile,
         'posts': posts,
-        'posts_count': posts_count,
-        'following_count': following_count,
-        'followers_count': followers_count,
+        'posts_count': profile.posts_count,
+        'following_count': profile.following_count,
+        'followers_count': profile.followers_count,
+        'is_following': is_following,
+        'follows_you': follows_you,
+        # Your own profile shows who you might follow
+        'suggestions': graph.suggestions_for(me) if profile == me else [],
     }
     return render(request, 'registration/profile.html', context)
 
@@ -66,7 +89,13 @@ def edit_profile(request):
     if request.method == 'POST':
         form = UserProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
+            photo_changed = 'photo' in form.changed_data
+            if photo_changed:
+                # The old photo's sizes until render_avatar runs, show the new original
+                profile.avatar_hash = ''
             form.save()
+            if photo_changed:
+                enqueue('accounts.render_avatar', profile_id=profile.id)
             messages.success(request, "Profile updated successfully.")
             messages.error(request, "Something went wrong.")
             return redirect('accounts:profile', username=request.user.username)
@@ -78,47 +107,62 @@ def edit_profile(request):
 @login_required
 def toggle_follow(request, username):
     """Follow or unfollow a user."""
-    target_profile = get_object_or_404(Profile, user__username=username)
+    target_profile = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
     me = request.user.profile
 
     if target_profile.user != request.user:
-        if target_profile in me.following.all():
-            me.following.remove(target_profile)
-        else:
-            me.following.add(target_profile)
-            # Notify the user they've been followed
-            Notification.objects.create(
-                recipient=target_profile.user,
-                actor=request.user,
-                verb='started following you',
-            )
+        with transaction.atomic():
+            if graph.is_following(me.id, target_profile.id):
+                graph.unfollow(me, target_profile)
+            elif graph.follow(me, target_profile):
+                # Notify the user they've been followed
+                notify_later(target_profile.user_id, request.user, 'started following you')
+    # Back to the page the button was on (e.g. a "who to follow" box)
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
     return redirect('accounts:profile', username=username)
     
 
 @login_required
 def followers_list(request, username):
     """Show users who follow <username>"""
-    profile = get_object_or_404(Profile, user__username=username)
-    # profile.followers is a queryset of Profile instances
-    followers = profile.followers.all()
-    return render(request, 'registration/followers_list.html', {'profile_owner': profile.user, 'profiles': followers,})
+    profile = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
+    followers, next_cursor = graph.followers_page(profile, request.user.profile, request.GET.get('before'))
+    context = {'profile_owner': profile.user, 'profiles': followers, 'next_cursor': next_cursor}
+    return render(request, 'registration/followers_list.html', context)
 
 @login_required
 def following_list(request, username):
     """Show users whom <username> is following."""
-    profile = get_object_or_404(Profile, user__username=username)
-    following = profile.following.all()
-    return render(request, 'registration/following_list.html', {'profile_owner': profile.user, 'profiles': following,})
+    profile = get_object_or_404(Profile.objects.select_related('user'), user__username=username)
+    following, next_cursor = graph.following_page(profile, request.user.profile, request.GET.get('before'))
+    context = {'profile_owner': profile.user, 'profiles': following, 'next_cursor': next_cursor}
+    return render(request, 'registration/following_list.html', context)
 
 @login_required
 def search_users(request):
-    """Search users by username substring."""
+    """Search users by username or bio, best match first."""
     query = request.GET.get('q', '').strip()
-    results = []
+    results, next_cursor = [], None
     if query:
-        # Case-insensitive partial match
-        results = User.objects.filter(username__icontains=query)
-    return render(request, 'registration/search_users.html', {'query': query, 'results': results,})
+        results, next_cursor = search.search(query, request.GET.get('after'))
+    context = {'query': query, 'results': results, 'next_cursor': next_cursor}
+    return render(request, 'registration/search_users.html', context)
+
+def _small_avatar(profile):
+    # The 32px render, the original only until the sizes exist
+    urls = profile.avatar_urls
+    if urls:
+        return urls['32']
+    return profile.photo.url if profile.photo else None
+
+@login_required
+def autocomplete_users(request):
+    """Usernames starting with ?q=, for the search box's suggestions."""
+    users = search.autocomplete(request.GET.get('q', '').strip())
+    results = [{'username': u.username, 'photo': _small_avatar(u.profile)} for u in users]
+    return JsonResponse({'results': results})
 
 @login_required
 def settings_page(request):
@@ -154,7 +198,20 @@ def delete_account(request):
             # verify the password
             if request.user.check_password(pwd):
                 # remove the user and log them out
-                request.user.delete()
+                me = request.user.profile
+                with transaction.atomic():
+                    # Counters on other people's posts/profiles that lose rows in the cascade
+                    touched_posts = list(Post.objects.filter(likes=request.user).values_list('id', flat=True))
+                    touched_posts += Post.objects.filter(comments__author=request.user).values_list('id', flat=True)
+                    touched_profiles = list(me.following.values_list('id', flat=True))
+                    touched_profiles += me.followers.values_list('id', flat=True)
+                    # Unread badges of everyone they notified
+                    notified = Notification.objects.filter(Q(actors=request.user) | Q(actor=request.user))
+                    touched_profiles += Profile.objects.filter(user__in=notified.values('recipient')).values_list('id', flat=True)
+                    request.user.delete()
+                    reconcile_posts(Post.objects.filter(id__in=touched_posts))
+                    reconcile_comments(Comment.objects.filter(post_id__in=touched_posts))
+                    reconcile_profiles(Profile.objects.filter(id__in=touched_profiles))
                 return redirect('viewpost:index')
             else:
                 form.add_error('password', 'Incorrect password.')
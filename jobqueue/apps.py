@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobqueueConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobqueue'
+
+    def ready(self):
+        # Import every app's tasks.py so their @task handlers get registered
+        autodiscover_modules('tasks')
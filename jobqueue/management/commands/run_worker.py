@@ -0,0 +1,35 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobqueue.queue import claim, run
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs (notifications, emails, feed fan-out)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Jobs claimed per round trip.")
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain what's due now, then exit.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        done = failed = 0
+        try:
+            while True:
+                jobs = claim(worker_id, options['batch_size'])
+                for job in jobs:
+                    if run(job):
+                        done += 1
+                    else:
+                        failed += 1
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker_id}: {done} done, {failed} failed."))
@@ -0,0 +1,28 @@
+from django.db import models
+from django.utils import timezone
+
+class Job(models.Model):
+    """A unit of deferred work, picked up by the run_worker command."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DEAD = 'dead'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DEAD, 'Dead')]
+
+    # Name a handler was registered under with @task
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not picked up before this, pushed back after each failure
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_after', 'id']
+        indexes = [models.Index(fields=['status', 'run_after', 'id'], name='job_claim_idx')]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
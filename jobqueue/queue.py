@@ -0,0 +1,54 @@
+"""
+A small job queue kept in the database.
+
+Apps register handlers in their tasks.py with @task('app.name'), and code
+on the request path calls enqueue('app.name', **payload). The job row is
+written once the surrounding transaction commits, and the run_worker
+command claims jobs in batches, retrying failures with exponential
+backoff until JOB_MAX_ATTEMPTS, after which they are left 'dead'.
+"""
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+
+from . import rows
+from .models import Job
+
+_handlers = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs called `name`."""
+    def register(func):
+        _handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, **payload):
+    """Queue `name` to run with `payload` once the current transaction commits."""
+    if settings.JOB_QUEUE_EAGER:
+        transaction.on_commit(lambda: _handlers[name](**payload))
+    else:
+        transaction.on_commit(lambda: Job.objects.create(name=name, payload=payload))
+
+
+def claim(worker_id, batch_size):
+    """Lock up to `batch_size` due jobs for `worker_id` and return them."""
+    return rows.claim(Job, 'run_after', Job.RUNNING, worker_id, batch_size, settings.JOB_LOCK_TIMEOUT)
+
+
+def run(job):
+    """Run one claimed job. Success deletes it, failure reschedules or buries it."""
+    handler = _handlers.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job {job.name!r}")
+        handler(**job.payload)
+    except Exception:
+        rows.fail(job, 'run_after', traceback.format_exc(), settings.JOB_MAX_ATTEMPTS, settings.JOB_RETRY_BACKOFF,
+                  give_up=handler is None)
+        return False
+    Job.objects.filter(id=job.id).delete()
+    return True
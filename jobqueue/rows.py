@@ -0,0 +1,51 @@
+"""
+Claiming and retrying the rows of a queue table, shared by the job queue
+and the email outbox (outbox/queue.py).
+
+The model needs status, attempts, locked_by, locked_at and last_error
+columns, QUEUED and DEAD statuses plus one for rows being worked on, and
+a `due` datetime column rows wait on (Job.run_after, Email.send_after).
+Workers claim due rows in batches with SKIP LOCKED. A row whose lock is
+older than `lock_timeout` belongs to a worker that died mid-batch and is
+handed out again.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _claimable(model, due, working, now, lock_timeout):
+    stale = now - lock_timeout
+    return Q(status=model.QUEUED, **{f'{due}__lte': now}) | Q(status=working, locked_at__lt=stale)
+
+
+def claim(model, due, working, worker_id, batch_size, lock_timeout):
+    """Lock up to `batch_size` due rows of `model` for `worker_id`, set them `working` and return them."""
+    now = timezone.now()
+    claimable = _claimable(model, due, working, now, lock_timeout)
+    with transaction.atomic():
+        rows = model.objects.select_for_update(skip_locked=True).filter(claimable)
+        ids = list(rows.order_by(due, 'id').values_list('id', flat=True)[:batch_size])
+        # Re-check the condition so two workers can't both win the same row
+        model.objects.filter(claimable, id__in=ids).update(status=working, locked_by=worker_id, locked_at=now)
+    return list(model.objects.filter(id__in=ids, status=working, locked_by=worker_id).order_by(due, 'id'))
+
+
+def fail(row, due, error, max_attempts, backoff, give_up=False):
+    """
+    Record a failed attempt at a claimed `row`: queue it again after
+    `backoff`, doubled for each attempt so far, or leave it dead once
+    it has had `max_attempts` (or straight away with `give_up`).
+    """
+    model = type(row)
+    attempts = row.attempts + 1
+    if give_up or attempts >= max_attempts:
+        logger.error("%s %s is dead after %s attempt(s)", model.__name__, row.pk, attempts)
+        changes = {'status': model.DEAD}
+    else:
+        changes = {'status': model.QUEUED, due: timezone.now() + backoff * 2 ** (attempts - 1)}
+    model.objects.filter(id=row.id).update(attempts=attempts, last_error=error, locked_by='', locked_at=None, **changes)
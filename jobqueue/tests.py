@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim, enqueue, run, task
+
+calls = []
+
+
+@task('tests.record')
+def record(**payload):
+    calls.append(payload)
+
+
+@task('tests.fail')
+def fail():
+    raise RuntimeError("boom")
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_BACKOFF=timedelta(seconds=30), JOB_LOCK_TIMEOUT=timedelta(minutes=10))
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('tests.record', n=1)
+        jobs = claim('w1', 10)
+        self.assertEqual([job.status for job in jobs], [Job.RUNNING])
+        self.assertTrue(run(jobs[0]))
+        self.assertEqual(calls, [{'n': 1}])
+        self.assertFalse(Job.objects.exists())
+
+    def test_backoff_then_dead(self):
+        job = Job.objects.create(name='tests.fail')
+        for attempt, delay in ((1, 30), (2, 60)):
+            before = timezone.now()
+            [claimed] = claim('w1', 10)
+            self.assertFalse(run(claimed))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.locked_by), (Job.QUEUED, attempt, ''))
+            self.assertIn('boom', job.last_error)
+            self.assertGreaterEqual(job.run_after, before + timedelta(seconds=delay))
+            self.assertLess(job.run_after, before + timedelta(seconds=delay + 5))
+            # Not due yet, then due
+            self.assertEqual(claim('w1', 10), [])
+            Job.objects.filter(id=job.id).update(run_after=timezone.now())
+        [claimed] = claim('w1', 10)
+        with self.assertLogs('jobqueue.rows', 'ERROR'):
+            self.assertFalse(run(claimed))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 3))
+        self.assertEqual(claim('w1', 10), [])
+
+    def test_unknown_handler(self):
+        job = Job.objects.create(name='tests.missing')
+        with self.assertLogs('jobqueue.rows', 'ERROR'):
+            self.assertFalse(run(claim('w1', 10)[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DEAD, 1))
+        self.assertIn('LookupError', job.last_error)
+
+    def test_claims(self):
+        first = Job.objects.create(name='tests.record')
+        Job.objects.create(name='tests.record', run_after=timezone.now() + timedelta(hours=1))
+        self.assertEqual([job.id for job in claim('w1', 10)], [first.id])
+        # Locked by w1, until the lock is older than JOB_LOCK_TIMEOUT
+        self.assertEqual(claim('w2', 10), [])
+        Job.objects.filter(id=first.id).update(locked_at=timezone.now() - timedelta(minutes=11))
+        [stolen] = claim('w2', 10)
+        self.assertEqual((stolen.id, stolen.locked_by), (first.id, 'w2'))
+
+    def test_batch_size(self):
+        jobs = [Job.objects.create(name='tests.record') for _ in range(3)]
+        self.assertEqual([job.id for job in claim('w1', 2)], [job.id for job in jobs[:2]])
+        self.assertEqual([job.id for job in claim('w2', 2)], [jobs[2].id])
@@ -1,6 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+from .unread import unread_count
+
 def unread_notifications(request):
     if request.user.is_authenticated:
-        count = request.user.notifications.filter(read=False).count()
+        # Only looked up if a template actually shows the badge
+        user_id = request.user.id
+        count = SimpleLazyObject(lambda: unread_count(user_id))
     else:
         count = 0
     return {'unread_notifications_count': count}
\ No newline at end of file
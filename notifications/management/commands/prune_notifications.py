@@ -0,0 +1,86 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from notifications import unread
+from notifications.models import Notification
+
+
+class Command(BaseCommand):
+    help = ("Delete notifications whose target no longer exists, and read "
+            "notifications older than --days, in small batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help="Keep read notifications younger than this many days.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.1,
+                            help="Seconds to pause between batches so other writers get the lock.")
+        parser.add_argument('--archive', metavar='PATH',
+                            help="Append every deleted row to this file as JSON lines first.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.archive = open(options['archive'], 'a') if options['archive'] and not options['dry_run'] else None
+        started = time.monotonic()
+        try:
+            orphaned = sum(self.prune(qs) for qs in self.orphaned())
+            cutoff = timezone.now() - timedelta(days=options['days'])
+            expired = Notification.objects.filter(read=True, timestamp__lt=cutoff)
+            if options['dry_run']:
+                # The orphans are still there, don't count old read ones twice
+                for orphans in self.orphaned():
+                    expired = expired.exclude(id__in=orphans.values('id'))
+            expired = self.prune(expired)
+        finally:
+            if self.archive:
+                self.archive.close()
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {orphaned} orphaned and {expired} expired notification(s) "
+            f"in {time.monotonic() - started:.1f}s."))
+
+    def orphaned(self):
+        """One queryset per target content type, of rows pointing at nothing."""
+        used = Notification.objects.exclude(target_ct=None).values_list('target_ct', flat=True).distinct()
+        for ct in ContentType.objects.filter(id__in=list(used)):
+            rows = Notification.objects.filter(target_ct=ct)
+            model = ct.model_class()
+            if model is None:
+                # The whole model is gone
+                yield rows
+            else:
+                yield rows.filter(~Exists(model._base_manager.filter(pk=OuterRef('target_id'))))
+
+    def prune(self, queryset):
+        if self.options['dry_run']:
+            return queryset.count()
+        removed = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                # Resume past the last batch rather than rescanning from the first row
+                ids = list(queryset.filter(id__gt=last_id).order_by('id')
+                           .values_list('id', flat=True)[:self.options['batch_size']])
+                if not ids:
+                    return removed
+                batch = Notification.objects.filter(id__in=ids)
+                if self.archive:
+                    for row in batch.values():
+                        self.archive.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                # Unread orphans still count towards someone's badge
+                for recipient_id, n in batch.filter(read=False).values_list('recipient').annotate(n=Count('id')):
+                    unread.decrement(recipient_id, n)
+                batch.delete()
+            removed += len(ids)
+            last_id = ids[-1]
+            time.sleep(self.options['sleep'])
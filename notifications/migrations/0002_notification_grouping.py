@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_existing_actors(apps, schema_editor):
+    """Existing notifications each have exactly one actor, record it."""
+    Notification = apps.get_model('notifications', 'Notification')
+    Through = Notification.actors.through
+    rows = Notification.objects.values_list('id', 'actor_id').iterator()
+    Through.objects.bulk_create(
+        (Through(notification_id=nid, user_id=uid) for nid, uid in rows),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='actors',
+            field=models.ManyToManyField(blank=True, related_name='grouped_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'verb', 'target_ct', 'target_id', 'timestamp'], name='notification_group_idx'),
+        ),
+        migrations.RunPython(add_existing_actors, migrations.RunPython.noop),
+    ]
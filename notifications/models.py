@@ -1,13 +1,76 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
+from viewpost.counters import bump
+from . import unread
+
+class NotificationManager(models.Manager):
+    def notify(self, recipient_id, actor_id, verb, target_ct_id=None, target_id=None):
+        """
+        Tell `recipient_id` that `actor_id` did `verb` (to the target object).
+
+        Within NOTIFICATION_GROUP_WINDOW, repeats for the same (recipient, verb,
+        target) are folded into one row ("alice and 41 others liked your post")
+        instead of a row each, and an actor who is already counted (e.g. like,
+        unlike, like again) changes nothing. Returns (notification, changed).
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            group = self.filter(
+                recipient_id=recipient_id, verb=verb, target_ct_id=target_ct_id, target_id=target_id,
+                timestamp__gte=now - settings.NOTIFICATION_GROUP_WINDOW,
+            ).order_by('-timestamp').first()
+            if group is None:
+                group = self.create(recipient_id=recipient_id, actor_id=actor_id, verb=verb,
+                                    target_ct_id=target_ct_id, target_id=target_id)
+                group.actors.add(actor_id)
+                unread.increment(recipient_id)
+                return group, True
+            try:
+                with transaction.atomic():
+                    group.actors.through.objects.create(notification=group, user_id=actor_id)
+            except IntegrityError:
+                # This actor is already part of the group
+                return group, False
+            self.filter(pk=group.pk).update(actor_id=actor_id, actor_count=F('actor_count') + 1, timestamp=now, read=False)
+            if group.read:
+                # Already seen, so it's back in the unread count
+                unread.increment(recipient_id)
+            return group, True
+
+    def remove_actor(self, user_id):
+        """
+        Take `user_id` out of every notification they acted in, before
+        their account is deleted. A group left with nobody goes too; the
+        others lose one from actor_count and, where they were the one
+        named, name the most recent remaining actor instead.
+        """
+        through = self.model.actors.through
+        grouped = set(through.objects.filter(user_id=user_id).values_list('notification_id', flat=True))
+        named = set(self.filter(actor_id=user_id).values_list('id', flat=True))
+        others = through.objects.filter(notification=OuterRef('pk')).exclude(user_id=user_id)
+        alone = self.filter(id__in=grouped | named).exclude(Exists(others))
+        # Unread ones still count towards the recipient's badge
+        for recipient_id, n in alone.filter(read=False).values_list('recipient').annotate(n=Count('id')):
+            unread.decrement(recipient_id, n)
+        alone.delete()
+        bump(self.filter(id__in=grouped), 'actor_count', -1)
+        self.filter(id__in=named).update(actor=Subquery(others.order_by('-id').values('user_id')[:1]))
 
 class Notification(models.Model):
     # Who gets notified
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
-    # Who did the action
-    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='actor_notifications')
+    # Who did the action (the most recent one, for grouped notifications)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='actor_notifications')
+    # Everyone folded into this notification, and how many of them there are
+    actors = models.ManyToManyField(User, related_name='grouped_notifications', blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
     # e.g 'liked ur post', 'commented on ur post', 'started following u'
     verb = models.CharField(max_length=255)
     # target object (Post, Comment, Profile)
@@ -18,5 +81,26 @@ class Notification(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    objects = NotificationManager()
+
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+        indexes = [
+            # Someone's notification list, newest first
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notification_inbox_idx'),
+            # Their unread ones (badge recount, mark-as-read)
+            models.Index(fields=['recipient', 'read', '-timestamp'], name='notification_unread_idx'),
+            # The lookup notify() does before deciding to insert or update
+            models.Index(fields=['recipient', 'verb', 'target_ct', 'target_id', 'timestamp'], name='notification_group_idx'),
+        ]
+
+    @property
+    def others_count(self):
+        """How many actors besides the one shown by name."""
+        return self.actor_count - 1
+
+
+# Grouped notifications outlive any one actor, see remove_actor()
+@receiver(pre_delete, sender=User)
+def remove_deleted_actor(sender, instance, **kwargs):
+    Notification.objects.remove_actor(instance.pk)
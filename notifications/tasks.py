@@ -0,0 +1,21 @@
+from django.contrib.contenttypes.models import ContentType
+
+from jobqueue.queue import enqueue, task
+from .models import Notification
+
+
+@task('notifications.notify')
+def notify(recipient_id, actor_id, verb, target_ct_id=None, target_id=None):
+    Notification.objects.notify(recipient_id, actor_id, verb, target_ct_id, target_id)
+
+
+def notify_later(recipient_id, actor, verb, target=None):
+    """Queue a notification, written by the worker after the current transaction commits."""
+    enqueue(
+        'notifications.notify',
+        recipient_id=recipient_id,
+        actor_id=actor.pk,
+        verb=verb,
+        target_ct_id=ContentType.objects.get_for_model(target).pk if target is not None else None,
+        target_id=target.pk if target is not None else None,
+    )
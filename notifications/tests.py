@@ -1,3 +1,145 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from viewpost import likes
+from viewpost.models import Post
+from .models import Notification
+from .unread import unread_count
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class NotifyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.fans = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'pw') for i in range(3)]
+        self.post = Post.objects.create(owner=self.author, content='hello')
+
+    def like(self, user, liked=True):
+        # Notifications are queued, and run eagerly, on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.set_like(self.post, user, liked)
+
+    def unread(self):
+        self.author.profile.refresh_from_db()
+        return self.author.profile.unread_notifications
+
+    def test_grouped(self):
+        for fan in self.fans:
+            self.like(fan)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual(set(notification.actors.all()), set(self.fans))
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(unread_count(self.author.id), 1)
+
+    def test_repeat_actor(self):
+        self.like(self.fans[0])
+        self.like(self.fans[0], False)
+        self.like(self.fans[0])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(self.unread(), 1)
+
+    def test_read_group_unread_again(self):
+        self.like(self.fans[0])
+        Notification.objects.update(read=True)
+        self.author.profile.unread_notifications = 0
+        self.author.profile.save()
+        cache.clear()
+        self.like(self.fans[1])
+        notification = Notification.objects.get()
+        self.assertFalse(notification.read)
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(self.unread(), 1)
+        # Another actor on the now unread group doesn't count it twice
+        self.like(self.fans[2])
+        self.assertEqual(self.unread(), 1)
+
+    def test_window(self):
+        self.like(self.fans[0])
+        old = timezone.now() - settings.NOTIFICATION_GROUP_WINDOW - timedelta(minutes=1)
+        Notification.objects.update(timestamp=old)
+        self.like(self.fans[1])
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.objects.order_by('-timestamp').first().actor, self.fans[1])
+        self.assertEqual(self.unread(), 2)
+
+    def test_actor_deleted(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.fans[1].delete()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, self.fans[0])
+        self.assertEqual(notification.actor_count, 1)
+        # The last one out takes the notification, and its unread count, along
+        self.fans[0].delete()
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.unread(), 0)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class PruneTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.fan = User.objects.create_user('fan', 'fan@example.com', 'pw')
+        self.kept = Post.objects.create(owner=self.author, content='kept')
+        self.gone = Post.objects.create(owner=self.author, content='gone')
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.set_like(self.kept, self.fan, True)
+            likes.set_like(self.gone, self.fan, True)
+        # Orphaned, still unread
+        self.orphan = Notification.objects.get(target_id=self.gone.id)
+        self.gone.delete()
+        # Read long ago, on a post that still exists
+        self.old = Notification.objects.create(recipient=self.author, actor=self.fan, verb='said hi', read=True)
+        Notification.objects.filter(id=self.old.id).update(timestamp=timezone.now() - timedelta(days=100))
+
+    def prune(self, *args):
+        out = io.StringIO()
+        call_command('prune_notifications', '--sleep', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def unread(self):
+        self.author.profile.refresh_from_db()
+        return self.author.profile.unread_notifications
+
+    def test_prune(self):
+        self.assertEqual(self.unread(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIn('Removed 1 orphaned and 1 expired', self.prune('--days', '90'))
+        self.assertEqual(list(Notification.objects.values_list('target_id', flat=True)), [self.kept.id])
+        self.assertEqual(self.unread(), 1)
+        self.assertEqual(unread_count(self.author.id), 1)
+
+    def test_dry_run(self):
+        # An old read orphan is reported once, as orphaned
+        Notification.objects.filter(id=self.orphan.id).update(read=True, timestamp=timezone.now() - timedelta(days=100))
+        self.assertIn('Would remove 1 orphaned and 1 expired', self.prune('--dry-run'))
+        self.assertEqual(Notification.objects.count(), 3)
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pruned.jsonl')
+            self.prune('--archive', path)
+            with open(path) as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(sorted(row['id'] for row in rows), [self.orphan.id, self.old.id])
+        self.assertEqual(next(row for row in rows if row['id'] == self.old.id)['verb'], 'said hi')
+        # Dry runs don't write one
+        self.prune('--dry-run', '--archive', path)
+        self.assertFalse(os.path.exists(path))
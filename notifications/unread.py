@@ -0,0 +1,48 @@
+"""
+Per-user unread notification count for the navbar badge.
+
+The number lives in Profile.unread_notifications and is mirrored in the
+cache, so rendering the badge is a cache hit rather than a COUNT over
+the user's notifications. The cache is only touched after commit so a
+rolled back notification never shows up in it.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from accounts.models import Profile
+from viewpost.counters import bump
+
+
+def _key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def unread_count(user_id):
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = Profile.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).first() or 0
+        cache.set(_key(user_id), count, settings.UNREAD_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def _incr_cached(user_id, delta):
+    try:
+        cache.incr(_key(user_id), delta)
+    except ValueError:
+        # Not cached right now, the next read loads it from the profile
+        pass
+
+
+def increment(user_id, delta=1):
+    bump(Profile.objects.filter(user_id=user_id), 'unread_notifications', delta)
+    transaction.on_commit(lambda: _incr_cached(user_id, delta))
+
+
+def forget(*user_ids):
+    """Drop cached counts, so the next read loads them from the profile."""
+    transaction.on_commit(lambda: cache.delete_many([_key(user_id) for user_id in user_ids]))
+
+
+def decrement(user_id, delta=1):
+    increment(user_id, -delta)
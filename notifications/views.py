@@ -1,12 +1,43 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.db.models import Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from viewpost.conditional import page_etag
+from viewpost.pagination import keyset_page
 from .models import Notification
+from . import unread
+
+def _notifications_etag(request):
+    # Just the columns that change when a notification does; a target that
+    # was deleted since isn't seen here and waits for the next new row
+    qs = request.user.notifications.only('id', 'timestamp', 'read', 'actor_id', 'actor_count')
+    notifications, _ = keyset_page(
+        qs, request.GET.get('before'), size=settings.NOTIFICATIONS_PAGE_SIZE, field='timestamp')
+    return page_etag(request, *((n.id, n.timestamp, n.read, n.actor_id, n.actor_count) for n in notifications))
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_notifications_etag)
 def notification_list(request):
-    #notifications = Notification()
-    # Mark all unread as read
-    request.user.notifications.filter(read=False).update(read=True)
-    # Grab all notifications
-    qs = request.user.notifications.all()
-    return render(request, 'notifications/list.html', {'notifications': qs})
\ No newline at end of file
+    """One page of the user's notifications, newest first."""
+    # actor in the same query, targets batched into one query per content type
+    qs = request.user.notifications.select_related('actor').prefetch_related('target')
+    notifications, next_cursor = keyset_page(
+        qs, request.GET.get('before'), size=settings.NOTIFICATIONS_PAGE_SIZE, field='timestamp')
+
+    # Mark as read only what this page shows: the (timestamp, id) range between
+    # its newest and oldest rows, anything outside it stays unread
+    if notifications:
+        newest, oldest = notifications[0], notifications[-1]
+        shown = request.user.notifications.filter(
+            read=False, timestamp__lte=newest.timestamp, timestamp__gte=oldest.timestamp,
+        ).filter(
+            Q(timestamp__lt=newest.timestamp) | Q(timestamp=newest.timestamp, id__lte=newest.id),
+            Q(timestamp__gt=oldest.timestamp) | Q(timestamp=oldest.timestamp, id__gte=oldest.id),
+        )
+        marked = shown.update(read=True)
+        if marked:
+            unread.decrement(request.user.id, marked)
+    return render(request, 'notifications/list.html', {'notifications': notifications, 'next_cursor': next_cursor})
@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import Email
+
+@admin.register(Email)
+class EmailAdmin(admin.ModelAdmin):
+    list_display = ['id', 'subject', 'status', 'attempts', 'send_after', 'created_at']
+    list_filter = ['status']
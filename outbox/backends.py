@@ -0,0 +1,15 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import Email
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    EMAIL_BACKEND that stores messages in the outbox instead of sending
+    them. send_outbox delivers them through OUTBOX_EMAIL_BACKEND.
+    """
+
+    def send_messages(self, email_messages):
+        emails = [Email.from_message(message) for message in email_messages if message.recipients()]
+        Email.objects.bulk_create(emails)
+        return len(emails)
@@ -0,0 +1,37 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from outbox.queue import claim, send
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox, a batch per connection."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails sent over one connection.")
+        parser.add_argument('--rate', type=float, default=settings.OUTBOX_RATE_LIMIT,
+                            help="Most emails sent per second (default: OUTBOX_RATE_LIMIT).")
+        parser.add_argument('--sleep', type=float, default=5.0, help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Send what's due now, then exit.")
+
+    def handle(self, *args, **options):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        sent = failed = 0
+        try:
+            while True:
+                emails = claim(worker_id, options['batch_size'])
+                if emails:
+                    ok, bad = send(emails, options['rate'])
+                    sent += ok
+                    failed += bad
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Outbox {worker_id}: {sent} sent, {failed} failed."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('outbox', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='email',
+            name='content_subtype',
+            field=models.CharField(default='plain', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='email',
+            name='encoding',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
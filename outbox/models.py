@@ -0,0 +1,65 @@
+from django.core.mail import EmailMultiAlternatives
+from django.db import models
+from django.utils import timezone
+
+class Email(models.Model):
+    """An outgoing email, waiting for the send_outbox command."""
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    DEAD = 'dead'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (SENDING, 'Sending'), (DEAD, 'Dead')]
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+    # [content, mimetype] pairs, e.g. an HTML version of the body
+    alternatives = models.JSONField(default=list)
+    # The body's text/<subtype> and charset, blank for DEFAULT_CHARSET
+    content_subtype = models.CharField(max_length=20, default='plain')
+    encoding = models.CharField(max_length=50, blank=True)
+
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not sent before this, pushed back after each failure
+    send_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['send_after', 'id']
+        indexes = [models.Index(fields=['status', 'send_after', 'id'], name='email_claim_idx')]
+
+    def __str__(self):
+        return f"{self.subject!r} to {', '.join(self.to)} ({self.status})"
+
+    @classmethod
+    def from_message(cls, message):
+        """An unsaved Email holding `message` (an EmailMessage)."""
+        if message.attachments:
+            raise ValueError("The outbox doesn't keep attachments")
+        return cls(
+            subject=message.subject, body=message.body, from_email=message.from_email,
+            to=list(message.to), cc=list(message.cc), bcc=list(message.bcc), reply_to=list(message.reply_to),
+            headers=dict(message.extra_headers),
+            alternatives=[list(alt) for alt in getattr(message, 'alternatives', [])],
+            content_subtype=message.content_subtype, encoding=message.encoding or '',
+        )
+
+    def message(self, connection=None):
+        """Rebuild the EmailMessage to send."""
+        message = EmailMultiAlternatives(
+            self.subject, self.body, self.from_email, self.to, self.bcc,
+            connection=connection, cc=self.cc, reply_to=self.reply_to, headers=self.headers,
+        )
+        message.content_subtype = self.content_subtype
+        message.encoding = self.encoding or None
+        for content, mimetype in self.alternatives:
+            message.attach_alternative(content, mimetype)
+        return message
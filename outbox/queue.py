@@ -0,0 +1,65 @@
+"""
+The email outbox.
+
+With EMAIL_BACKEND = 'outbox.backends.OutboxBackend', sending mail
+(send_mail(), the password reset form...) only inserts an Email row, in
+the same transaction as whatever caused it. The send_outbox command
+claims due emails in batches and delivers each batch over one connection
+of OUTBOX_EMAIL_BACKEND, so a burst of signups costs one SMTP session
+per batch rather than one per message. OUTBOX_RATE_LIMIT caps messages
+per second. Failures are retried with exponential backoff until
+OUTBOX_MAX_ATTEMPTS, after which the email is left 'dead'. Claiming and
+retrying work like the job queue's, see jobqueue/rows.py.
+"""
+import time
+import traceback
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from jobqueue import rows
+from .models import Email
+
+
+def claim(worker_id, batch_size):
+    """Lock up to `batch_size` due emails for `worker_id` and return them."""
+    return rows.claim(Email, 'send_after', Email.SENDING, worker_id, batch_size, settings.OUTBOX_LOCK_TIMEOUT)
+
+
+def send(emails, rate=None):
+    """
+    Deliver claimed `emails` over one connection, at most `rate` per
+    second. Sent emails are deleted, failed ones rescheduled or buried.
+    Returns (sent, failed).
+    """
+    sent = failed = 0
+    started = time.monotonic()
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND, fail_silently=False)
+    is_open = False
+    for i, email in enumerate(emails):
+        if rate:
+            time.sleep(max(started + i / rate - time.monotonic(), 0))
+        try:
+            if not is_open:
+                connection.open()
+                is_open = True
+            connection.send_messages([email.message(connection)])
+        except Exception:
+            failed += 1
+            rows.fail(email, 'send_after', traceback.format_exc(),
+                      settings.OUTBOX_MAX_ATTEMPTS, settings.OUTBOX_RETRY_BACKOFF)
+            # Start the next one on a fresh connection, this one may be broken
+            try:
+                connection.close()
+            except Exception:
+                pass
+            is_open = False
+        else:
+            sent += 1
+            Email.objects.filter(id=email.id).delete()
+    if is_open:
+        connection.close()
+    if rate:
+        # Keep the pace across batches too
+        time.sleep(max(started + len(emails) / rate - time.monotonic(), 0))
+    return sent, failed
@@ -0,0 +1,67 @@
+import io
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.emails import send_welcome_email
+from .models import Email
+from .queue import claim, send
+
+
+class FailingBackend(BaseEmailBackend):
+
+    def send_messages(self, email_messages):
+        raise ConnectionError("SMTP server went away")
+
+
+@override_settings(EMAIL_BACKEND='outbox.backends.OutboxBackend',
+                   OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BACKOFF=timedelta(minutes=1))
+class OutboxTests(TestCase):
+
+    def test_queued_then_sent(self):
+        user = User.objects.create_user('ann', 'ann@example.com', 'pw')
+        send_welcome_email(user)
+        # Only queued, nothing goes out until send_outbox runs
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Email.objects.get().status, Email.QUEUED)
+        call_command('send_outbox', '--once', stdout=io.StringIO())
+        [message] = mail.outbox
+        self.assertEqual((message.subject, message.to), ('Welcome to Viewpost!', ['ann@example.com']))
+        self.assertFalse(Email.objects.exists())
+
+    def test_failure_backs_off(self):
+        EmailMessage('Hi', 'Body', 'from@example.com', ['to@example.com']).send()
+        with override_settings(OUTBOX_EMAIL_BACKEND='outbox.tests.FailingBackend'):
+            before = timezone.now()
+            self.assertEqual(send(claim('w1', 10)), (0, 1))
+            email = Email.objects.get()
+            self.assertEqual((email.status, email.attempts, email.locked_by), (Email.QUEUED, 1, ''))
+            self.assertIn('SMTP server went away', email.last_error)
+            self.assertGreaterEqual(email.send_after, before + timedelta(minutes=1))
+            self.assertEqual(claim('w1', 10), [])
+
+            Email.objects.update(send_after=timezone.now())
+            with self.assertLogs('jobqueue.rows', 'ERROR'):
+                self.assertEqual(send(claim('w1', 10)), (0, 1))
+            self.assertEqual(Email.objects.get().status, Email.DEAD)
+        self.assertEqual(mail.outbox, [])
+
+    def test_html_round_trip(self):
+        message = EmailMessage('Hi', '<p>Hello</p>', 'from@example.com', ['to@example.com'], cc=['cc@example.com'],
+                               headers={'X-Campaign': 'welcome'})
+        message.content_subtype = 'html'
+        message.encoding = 'iso-8859-1'
+        message.send()
+        self.assertEqual(send(claim('w1', 10)), (1, 0))
+        [sent] = mail.outbox
+        mime = sent.message()
+        self.assertEqual(mime.get_content_type(), 'text/html')
+        self.assertEqual(mime.get_content_charset(), 'iso-8859-1')
+        self.assertEqual((sent.cc, mime['X-Campaign']), (['cc@example.com'], 'welcome'))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ViewpostConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'viewpost'
+
+    def ready(self):
+        # Keeps the post search index in step with posts
+        from . import search  # noqa: F401
@@ -0,0 +1,115 @@
+"""
+Fragment cache for post cards.
+
+The part of a card that looks the same to everyone (owner, avatar,
+image, content, counts) is rendered once and cached under a key made of
+a signature of the row state it shows: like and comment counts, image
+renders and the owner's name and avatar. Posts are never edited
+otherwise, so any change shows up in the key and stale fragments are
+never read again, they simply expire. The key comes from the database
+row, not a counter in the cache, so a change made by another process
+(run_worker, reconcile_counters...) is seen even with a per-process
+cache.
+
+What differs per viewer or per request is left as slots in the cached
+HTML and filled in on every render: the like button (the viewer's heart
+and CSRF token), the "Posted ... ago" time and the owner's actions.
+
+Only plain get/set/incr are used, so any cache backend works, LocMem and
+file-based included. The hit and miss counters live in the cache as
+well, so with the per-process default each process only counts its own.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Post
+
+LIKE_SLOT = '<!--card:like-->'
+POSTED_SLOT = '<!--card:posted-->'
+ACTIONS_SLOT = '<!--card:actions-->'
+
+HITS_KEY = 'post-card:hits'
+MISSES_KEY = 'post-card:misses'
+
+
+def _signature(post):
+    profile = post.owner.profile
+    raw = json.dumps([
+        post.owner.username, profile.avatar_hash, profile.photo.name or '',
+        post.like_count, post.comment_count, post.image_variants,
+    ], sort_keys=True)
+    return hashlib.md5(raw.encode()).hexdigest()[:12]
+
+
+def _card_key(post, template):
+    return f'post-card:{template}:{post.id}:{_signature(post)}'
+
+
+def _count(key, n):
+    if not n:
+        return
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        if not cache.add(key, n, None):
+            cache.incr(key, n)
+
+
+def _fill(html, post, request):
+    html = html.replace(LIKE_SLOT, render_to_string('viewpost/like_button.html', {'post': post}, request=request))
+    html = html.replace(POSTED_SLOT, str(naturaltime(post.created_at)))
+    if ACTIONS_SLOT in html:
+        actions = render_to_string('viewpost/post_card_actions.html', {'post': post}, request=request)
+        html = html.replace(ACTIONS_SLOT, actions)
+    return html
+
+
+def render_cards(posts, request, template='viewpost/post_card.html'):
+    """
+    HTML for the cards of `posts`, as seen by request.user. Posts need
+    owner__profile joined (see Post.objects.for_feed()).
+    """
+    posts = list(posts)
+    keys = {post.id: _card_key(post, template) for post in posts}
+    cached = cache.get_many(keys.values())
+    rendered = {}
+    cards = []
+    for post in posts:
+        html = cached.get(keys[post.id])
+        if html is None:
+            html = rendered[keys[post.id]] = render_to_string(template, {'post': post})
+        cards.append(_fill(html, post, request))
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    _count(HITS_KEY, len(posts) - len(rendered))
+    _count(MISSES_KEY, len(rendered))
+    return ''.join(cards)
+
+
+def watermark(posts, viewer):
+    """
+    A string that changes whenever the card of any of `posts` would look
+    different to `viewer`: the cached part, or the viewer's own heart.
+    Posts only need Post.objects.for_etag() columns.
+    """
+    posts = list(posts)
+    # The like count alone can come back to the same number, e.g. the
+    # viewer likes a post while someone else unlikes it
+    liked = set(Post.likes.through.objects.filter(user=viewer, post_id__in=[post.id for post in posts])
+                .values_list('post_id', flat=True))
+    return ','.join(f'{post.id}.{_signature(post)}.{int(post.id in liked)}' for post in posts)
+
+
+def stats():
+    """Hits and misses since the counters were last reset."""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': counts.get(HITS_KEY, 0), 'misses': counts.get(MISSES_KEY, 0)}
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
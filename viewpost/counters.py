@@ -0,0 +1,83 @@
+"""
+Denormalized counters on Post, Comment and Profile.
+
+Views bump them with F() expressions inside the same transaction as the
+row they count, and the reconcile_*() functions recompute them from the
+source tables to repair any drift.
+"""
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from accounts.models import Profile
+from .models import Comment, Post
+
+Follow = Profile.following.through
+Like = Post.likes.through
+
+
+def bump(queryset, field, delta=1):
+    """Add `delta` to `field` on every row of `queryset`, never going below zero."""
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def _count_of(queryset, field, outer='pk'):
+    """Correlated COUNT(*) of `queryset` rows whose `field` matches the outer row."""
+    counts = queryset.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def post_counts():
+    return {
+        'like_count': _count_of(Like.objects, 'post'),
+        'comment_count': _count_of(Comment.objects, 'post'),
+    }
+
+
+def comment_counts():
+    # Replies share the comment's post and extend its path
+    replies = Comment.objects.filter(
+        post=OuterRef('post'), path__startswith=OuterRef('path'),
+    ).exclude(pk=OuterRef('pk')).order_by().values('post').annotate(n=Count('*')).values('n')
+    return {'reply_count': Coalesce(Subquery(replies), 0)}
+
+
+def profile_counts():
+    # Looked up lazily, notifications.models imports this module
+    Notification = apps.get_model('notifications', 'Notification')
+    return {
+        'followers_count': _count_of(Follow.objects, 'to_profile'),
+        'following_count': _count_of(Follow.objects, 'from_profile'),
+        'posts_count': _count_of(Post.objects, 'owner', outer='user_id'),
+        'unread_notifications': _count_of(Notification.objects.filter(read=False), 'recipient', outer='user_id'),
+    }
+
+
+def _reconcile(queryset, counts):
+    """Rewrite only the rows of `queryset` whose stored counters drifted, returns their ids."""
+    real = {f'real_{name}': expr for name, expr in counts.items()}
+    drifted = queryset.annotate(**real).exclude(**{name: F(f'real_{name}') for name in counts})
+    ids = list(drifted.values_list('pk', flat=True))
+    if ids:
+        queryset.model.objects.filter(pk__in=ids).update(**counts)
+    return ids
+
+
+def reconcile_posts(queryset=None):
+    """Recompute like/comment counts. Returns how many posts were off."""
+    ids = _reconcile(Post.objects.all() if queryset is None else queryset, post_counts())
+    return len(ids)
+
+
+def reconcile_comments(queryset=None):
+    """Recompute reply counts. Returns how many comments were off."""
+    return len(_reconcile(Comment.objects.all() if queryset is None else queryset, comment_counts()))
+
+
+def reconcile_profiles(queryset=None):
+    """Recompute follower/following/post/unread counts. Returns how many profiles were off."""
+    from notifications import unread  # imports this module
+    ids = _reconcile(Profile.objects.all() if queryset is None else queryset, profile_counts())
+    # The unread badge is cached as well
+    unread.forget(*Profile.objects.filter(pk__in=ids).values_list('user_id', flat=True))
+    return len(ids)
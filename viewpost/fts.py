@@ -0,0 +1,93 @@
+"""
+Helpers for the SQLite FTS5 search tables (see accounts/search.py and
+viewpost/search.py).
+
+Each table mirrors some columns of a model, keyed by the model's primary
+key as the FTS rowid. Pages of matches are ranked by bm25() and walked
+with a (score, id) cursor, so deep pages cost about the same as the first.
+"""
+from django.db import connection
+
+from .pagination import decode_cursor, encode_cursor
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def fts_phrase(query):
+    """Quote `query` as one FTS5 phrase, so user input is never parsed as syntax."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def index_row(table, rowid, **columns):
+    """Insert or replace the row for `rowid`."""
+    if not fts_enabled():
+        return
+    names = ', '.join(columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [rowid])
+        cursor.execute(f'INSERT INTO {table} (rowid, {names}) VALUES (%s, {placeholders})', [rowid, *columns.values()])
+
+
+def insert_rows(table, columns, rows):
+    """
+    Insert (rowid, *values) `rows` with one executemany. Nothing is
+    replaced, so only for rowids that aren't indexed yet.
+    """
+    if not fts_enabled() or not rows:
+        return
+    names = ', '.join(columns)
+    placeholders = ', '.join(['%s'] * len(columns))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} (rowid, {names}) VALUES (%s, {placeholders})', rows)
+
+
+def unindex_row(table, rowid):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE rowid = %s', [rowid])
+
+
+def _ranked_position(position):
+    # score isn't a model field, so decode_cursor() leaves it as whatever
+    # JSON the cursor held. Anything but a number is a tampered cursor.
+    if position is None:
+        return None
+    score, last_id = position
+    if isinstance(score, bool) or not isinstance(score, (int, float)):
+        return None
+    if isinstance(last_id, bool) or not isinstance(last_id, int):
+        return None
+    return float(score), last_id
+
+
+def ranked_page(table, query, model, cursor=None, size=20, weights=()):
+    """
+    Return (ids, next_cursor) for one page of rows matching `query`, best
+    first. `weights` are the per-column bm25() weights. Ids are primary
+    keys of `model`, which only types the cursor.
+    """
+    args = ''.join(', %s' for _ in weights)
+    sql = (f'SELECT id, score FROM (SELECT rowid AS id, bm25({table}{args}) AS score '
+           f'FROM {table} WHERE {table} MATCH %s)')
+    params = [*weights, fts_phrase(query)]
+    position = _ranked_position(decode_cursor(cursor, model, 'score', 'id'))
+    if position is not None:
+        # bm25 scores are negative, lower is better
+        sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY score, id LIMIT %s'
+    params.append(size + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        ranked = db.fetchall()
+
+    next_cursor = None
+    if len(ranked) > size:
+        ranked = ranked[:size]
+        last_id, last_score = ranked[-1]
+        next_cursor = encode_cursor(last_score, last_id)
+    return [row_id for row_id, _ in ranked], next_cursor
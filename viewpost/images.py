@@ -0,0 +1,109 @@
+"""
+Resized copies of post images.
+
+Uploads are stored as-is. A job then renders a feed-sized and a
+detail-sized copy of each, as both JPEG and WebP, and saves them next to
+the original (post_images/cat.png -> post_images/cat.thumb.webp, ...).
+Decoding and encoding happen in a process pool, so they never hold up
+the worker process and the backfill command can use every core.
+
+Post.image_variants records what was written:
+    {'thumb': {'width': 400, 'height': 300, 'jpeg': <name>, 'webp': <name>}, ...}
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .models import Post
+
+# Variant name and width in pixels, smallest first. The feed shows images
+# 200px wide, so the thumbnail covers 2x screens too.
+VARIANTS = [('thumb', 400), ('detail', 1200)]
+# Key in image_variants, Pillow format, file extension, save options
+FORMATS = [
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+]
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _executor
+
+
+def render(data):
+    """
+    Encode every variant of the image in `data` (raw file bytes). Runs in
+    the process pool, so it only deals in bytes and plain dicts.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # Phones store rotation in EXIF, bake it in before it's stripped
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    rendered = {}
+    for variant, width in VARIANTS:
+        copy = image.copy()
+        # Never upscale, a small original is served at its own size
+        copy.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        files = {'width': copy.width, 'height': copy.height}
+        for key, fmt, _, options in FORMATS:
+            out = io.BytesIO()
+            target = copy if fmt == 'WEBP' or copy.mode == 'RGB' else copy.convert('RGB')
+            target.save(out, fmt, **options)
+            files[key] = out.getvalue()
+        rendered[variant] = files
+    return rendered
+
+
+def _read(post):
+    with post.image.open('rb') as f:
+        return f.read()
+
+
+def _store(post, rendered):
+    """Save rendered files next to the original and record them on the post."""
+    base, _ = os.path.splitext(post.image.name)
+    storage = post.image.storage
+    variants = {}
+    for variant, files in rendered.items():
+        variants[variant] = {'width': files['width'], 'height': files['height']}
+        for key, _, ext, _ in FORMATS:
+            name = storage.save(f'{base}.{variant}.{ext}', ContentFile(files[key]))
+            variants[variant][key] = name
+    Post.objects.filter(pk=post.pk).update(image_variants=variants)
+    post.image_variants = variants
+    return variants
+
+
+def generate(post):
+    """Render and store the variants of one post's image."""
+    return _store(post, _pool().submit(render, _read(post)).result())
+
+
+def generate_many(posts):
+    """
+    Render a batch of posts' images in parallel. Yields (post, error) as
+    each one is done, error being None on success.
+    """
+    pending = []
+    for post in posts:
+        try:
+            pending.append((post, _pool().submit(render, _read(post))))
+        except OSError as exc:
+            # The original is missing from storage
+            yield post, exc
+    for post, future in pending:
+        try:
+            _store(post, future.result())
+        except Exception as exc:
+            yield post, exc
+        else:
+            yield post, None
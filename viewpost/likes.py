@@ -0,0 +1,55 @@
+"""
+Likes, done straight on the Post.likes through table.
+
+Every operation is an indexed DELETE or INSERT on the (post, user) unique
+pair plus one counter bump, so it costs the same on a post with three
+likes and on one with three hundred thousand.
+"""
+from django.db import IntegrityError, transaction
+
+from notifications.tasks import notify_later
+from .counters import bump
+from .models import Post
+
+Like = Post.likes.through
+
+
+def _add(post, user):
+    """Insert the like row, returns False if it was already there."""
+    try:
+        # Savepoint, so losing a race doesn't break the outer transaction
+        with transaction.atomic():
+            Like.objects.create(post_id=post.id, user_id=user.id)
+    except IntegrityError:
+        return False
+    bump(Post.objects.filter(id=post.id), 'like_count')
+    # Notify but don't notify urself, re-likes fold into the same notification
+    if post.owner_id != user.id:
+        notify_later(post.owner_id, user, 'liked your post', target=post)
+    return True
+
+
+def _remove(post, user):
+    """Delete the like row, returns False if there wasn't one."""
+    deleted, _ = Like.objects.filter(post_id=post.id, user_id=user.id).delete()
+    if deleted:
+        bump(Post.objects.filter(id=post.id), 'like_count', -1)
+    return bool(deleted)
+
+
+def toggle_like(post, user):
+    """Like `post` if `user` hasn't yet, otherwise unlike it. Returns the new state."""
+    with transaction.atomic():
+        if _remove(post, user):
+            return False
+        _add(post, user)
+        return True
+
+
+def set_like(post, user, liked):
+    """Make `user` like (or not like) `post`, doing nothing if it already does."""
+    with transaction.atomic():
+        if liked:
+            _add(post, user)
+        else:
+            _remove(post, user)
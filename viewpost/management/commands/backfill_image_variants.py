@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from viewpost import images
+from viewpost.models import Post
+
+
+class Command(BaseCommand):
+    help = "Render the resized copies of post images uploaded before they existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=50, help="Images handed to the process pool at once.")
+        parser.add_argument('--force', action='store_true', help="Re-render posts that already have variants.")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            posts = posts.filter(image_variants={})
+        rendered = failed = 0
+        last_id = 0
+        while True:
+            chunk = list(posts.filter(pk__gt=last_id).order_by('pk').only('id', 'image', 'image_variants')[:options['chunk_size']])
+            if not chunk:
+                break
+            for post, error in images.generate_many(chunk):
+                if error is None:
+                    rendered += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f"Post {post.pk} ({post.image.name}): {error}")
+            last_id = chunk[-1].pk
+            self.stdout.write(f"Rendered {rendered} images...")
+        self.stdout.write(self.style.SUCCESS(f"Done: {rendered} rendered, {failed} failed."))
@@ -0,0 +1,24 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from viewpost import cards
+
+
+class Command(BaseCommand):
+    help = "Show how often rendered post cards came from the cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after showing them.")
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            self.stderr.write("The default cache is per process, so these are only this command's own counts. "
+                              "Point CACHES at a shared backend to see the server's.")
+        counts = cards.stats()
+        total = counts['hits'] + counts['misses']
+        rate = counts['hits'] / total if total else 0
+        self.stdout.write(f"hits: {counts['hits']}  misses: {counts['misses']}  hit rate: {rate:.1%}")
+        if options['reset']:
+            cards.reset_stats()
+            self.stdout.write("Counters reset.")
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from viewpost import search
+
+
+class Command(BaseCommand):
+    help = "Re-index every post for search, one chunk of posts at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Posts indexed per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.05, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write("The post search index only exists on SQLite, nothing to do.")
+            return
+        indexed = 0
+        for count in search.rebuild(options['chunk_size']):
+            indexed += count
+            self.stdout.write(f"Indexed {indexed} posts...")
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the post index, {indexed} posts."))
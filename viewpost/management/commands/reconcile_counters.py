@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import Profile
+from viewpost.counters import reconcile_comments, reconcile_posts, reconcile_profiles
+from viewpost.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/reply/follow/post/unread counters that have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows checked per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.05, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        for model, reconcile in [(Post, reconcile_posts), (Comment, reconcile_comments), (Profile, reconcile_profiles)]:
+            repaired = self.repair(model, reconcile, options['chunk_size'], options['sleep'])
+            self.stdout.write(f"{model._meta.verbose_name_plural}: repaired {repaired}")
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
+
+    def repair(self, model, reconcile, chunk_size, pause):
+        """Walk the table by primary key range, one short transaction per chunk."""
+        repaired = 0
+        last_id = 0
+        while True:
+            ids = list(model.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return repaired
+            with transaction.atomic():
+                repaired += reconcile(model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]))
+            last_id = ids[-1]
+            time.sleep(pause)
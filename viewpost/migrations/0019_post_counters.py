@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('viewpost', 'Post')
+    Comment = apps.get_model('viewpost', 'Comment')
+    Like = Post.likes.through
+
+    def count_of(queryset):
+        counts = queryset.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('*')).values('n')
+        return Coalesce(Subquery(counts), 0)
+
+    Post.objects.update(like_count=count_of(Like.objects), comment_count=count_of(Comment.objects))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewpost', '0018_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    """Parents are always older than their replies, so walking by id sees them first."""
+    Comment = apps.get_model('viewpost', 'Comment')
+    seen = {}
+    batch = []
+    for comment in Comment.objects.order_by('id').only('id', 'parent_id').iterator():
+        prefix, depth = seen.get(comment.parent_id, ('', -1))
+        comment.path = f"{prefix}{comment.id:010d}/"
+        comment.depth = depth + 1
+        seen[comment.id] = (comment.path, comment.depth)
+        batch.append(comment)
+        if len(batch) >= 500:
+            Comment.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    Comment.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewpost', '0020_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comment_replies_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comment_path_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:33
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_reply_counts(apps, schema_editor):
+    """Every comment counts once towards each ancestor on its path."""
+    Comment = apps.get_model('viewpost', 'Comment')
+    counts = Counter()
+    for path in Comment.objects.values_list('path', flat=True).iterator():
+        counts.update(int(step) for step in path.split('/')[:-2])
+    batch = [Comment(id=comment_id, reply_count=n) for comment_id, n in counts.items()]
+    Comment.objects.bulk_update(batch, ['reply_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewpost', '0021_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_reply_counts, migrations.RunPython.noop),
+    ]
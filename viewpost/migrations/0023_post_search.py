@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:45
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """The FTS5 mirror only exists on SQLite, see viewpost/search.py."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE viewpost_post_search USING fts5(content, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        "INSERT INTO viewpost_post_search (rowid, content) SELECT id, content FROM viewpost_post"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS viewpost_post_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('viewpost', '0022_comment_reply_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,18 +1,69 @@
 from django.db import models
+from django.db.models import Exists, OuterRef
 from django.contrib.auth.models import User
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self, viewer):
+        """
+        Everything a post card shows (owner, avatar, like/comment counts and
+        whether `viewer` liked it) in one query instead of several per post.
+        """
+        likes = self.model.likes.through.objects
+        return self.select_related('owner__profile').annotate(
+            viewer_has_liked=Exists(likes.filter(post=OuterRef('pk'), user=viewer)),
+        )
+
+    def for_etag(self):
+        """Just what viewpost.cards.watermark() reads, for ETags computed before a page renders."""
+        return self.select_related('owner__profile').only(
+            'id', 'created_at', 'like_count', 'comment_count', 'image_variants',
+            'owner__username', 'owner__profile__avatar_hash', 'owner__profile__photo',
+        )
+
 class Post(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    # Resized copies of the image, filled in by a job, see viewpost/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    # Kept in step by the views, see viewpost/counters.py
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Main feed, newest first with id to break ties
+            models.Index(fields=['-created_at', '-id'], name='post_feed_idx'),
+            # A profile's posts
+            models.Index(fields=['owner', '-created_at', '-id'], name='post_owner_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.owner.username}: {self.content[:30]}..."
+
+    @property
+    def image_sources(self):
+        """
+        srcset strings for the resized copies of the image, plus the
+        thumbnail as a fallback src. None until the copies are rendered.
+        """
+        if not self.image_variants:
+            return None
+        storage = self.image.storage
+        variants = list(self.image_variants.values())
+        thumb = self.image_variants['thumb']
+        return {
+            'jpeg': ', '.join(f"{storage.url(v['jpeg'])} {v['width']}w" for v in variants),
+            'webp': ', '.join(f"{storage.url(v['webp'])} {v['width']}w" for v in variants),
+            'src': storage.url(thumb['jpeg']),
+            'width': thumb['width'],
+            'height': thumb['height'],
+        }
     
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -20,9 +71,59 @@ class Comment(models.Model):
     text = models.TextField()
     date_added = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Materialized path: the zero-padded ids of every ancestor and then this
+    # comment, so ordering a post's comments by path lists each thread in
+    # reading order, every reply right under its parent.
+    path = models.TextField(editable=False, default='')
+    depth = models.PositiveSmallIntegerField(editable=False, default=0)
+    # Replies anywhere under this comment, kept in step by the views
+    reply_count = models.PositiveIntegerField(default=0)
+
+    PATH_STEP = 10
 
     class Meta:
         ordering = ['date_added']
+        indexes = [
+            # Top-level comments of a post, oldest first
+            models.Index(fields=['post', 'parent', 'date_added'], name='comment_thread_idx'),
+            # A post's whole discussion in thread order
+            models.Index(fields=['post', 'path'], name='comment_path_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.author.username}: {self.text[:20]}..."
\ No newline at end of file
+        return f"{self.author.username}: {self.text[:20]}..."
+
+    @property
+    def ancestor_ids(self):
+        """Ids of every comment above this one, read off the path."""
+        return [int(step) for step in self.path.split('/')[:-2]]
+
+    def descendants(self):
+        """Every reply under this comment, at any depth."""
+        # A range on the path rather than LIKE, so it stays on comment_path_idx.
+        # Descendant paths extend ours, and '0' sorts right after '/'.
+        return Comment.objects.filter(post_id=self.post_id, path__gt=self.path, path__lt=self.path[:-1] + '0')
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The path needs our id, so it can only be filled in after the insert
+        if not self.path:
+            prefix = self.parent.path if self.parent else ''
+            self.depth = self.parent.depth + 1 if self.parent else 0
+            self.path = f"{prefix}{self.pk:0{self.PATH_STEP}d}/"
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+
+class TimelineEntry(models.Model):
+    """A post fanned out into one follower's home timeline."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline', db_index=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copied from the post so reading a timeline never touches the Post table order
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry')]
+        indexes = [models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx')]
+
+    def __str__(self):
+        return f"{self.user_id} <- post {self.post_id}"
@@ -0,0 +1,70 @@
+"""
+Post search.
+
+On SQLite, post content is mirrored into an FTS5 table (porter-stemmed
+words), kept in step by the receivers below as posts are created, edited
+and deleted. rebuild_post_index refills it from scratch. Other databases
+fall back to a keyset-paginated icontains.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .fts import fts_enabled, index_row, ranked_page, unindex_row
+from .models import Post
+from .pagination import keyset_page
+
+TABLE = 'viewpost_post_search'
+
+
+def search(posts, query, cursor=None, size=None):
+    """
+    (posts, next_cursor) for one page of `posts` matching `query`, best
+    match first. `posts` is the queryset to load them from, e.g.
+    Post.objects.for_feed(viewer).
+    """
+    size = size or settings.POST_SEARCH_PAGE_SIZE
+    if not fts_enabled():
+        return keyset_page(posts.filter(content__icontains=query), cursor, size)
+
+    ids, next_cursor = ranked_page(TABLE, query, Post, cursor, size)
+    found = posts.order_by().in_bulk(ids)
+    return [found[post_id] for post_id in ids if post_id in found], next_cursor
+
+
+def rebuild(chunk_size=1000):
+    """
+    Re-index every post, walking the posts table by primary key so memory
+    stays flat. Each chunk replaces its own id range in one short
+    transaction, so searches keep working while this runs. Yields the
+    size of each chunk as it's done.
+    """
+    if not fts_enabled():
+        return
+    last_id = 0
+    while True:
+        chunk = list(Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'content')[:chunk_size])
+        # Rows in the range that no longer have a post go too
+        upper = chunk[-1][0] if chunk else None
+        with transaction.atomic(), connection.cursor() as cursor:
+            if upper is None:
+                cursor.execute(f'DELETE FROM {TABLE} WHERE rowid > %s', [last_id])
+                return
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid > %s AND rowid <= %s', [last_id, upper])
+            cursor.executemany(f'INSERT INTO {TABLE} (rowid, content) VALUES (%s, %s)', chunk)
+        last_id = upper
+        yield len(chunk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    # Image or other field changes leave the indexed text alone
+    if update_fields and 'content' not in update_fields:
+        return
+    index_row(TABLE, instance.pk, content=instance.content)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    unindex_row(TABLE, instance.pk)
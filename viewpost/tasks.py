@@ -0,0 +1,17 @@
+from jobqueue.queue import task
+from .models import Post
+from . import images, timeline
+
+
+@task('viewpost.fan_out')
+def fan_out(post_id):
+    post = Post.objects.filter(id=post_id).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@task('viewpost.render_image')
+def render_image(post_id):
+    post = Post.objects.filter(id=post_id).first()
+    if post is not None and post.image:
+        images.generate(post)
@@ -0,0 +1,12 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from viewpost import cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def render_post_cards(context, posts, card_template='viewpost/post_card.html'):
+    """Render `posts` with `card_template`, through the card fragment cache."""
+    return mark_safe(cards.render_cards(posts, context['request'], card_template))
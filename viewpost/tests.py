@@ -1,3 +1,435 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from unittest import skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from accounts import graph
+from accounts.models import Profile
+from jobqueue.queue import claim, run
+from notifications.unread import unread_count
+from . import images, likes
+from .counters import reconcile_comments, reconcile_posts, reconcile_profiles
+from .models import Comment, Post, TimelineEntry
+
+
+class QueryPlanAssertions:
+    """
+    Every query fed to EXPLAIN QUERY PLAN, failing on a full table scan
+    or a temp B-tree sort. Mixed into TestCases, SQLite only.
+    """
+
+    def assertIndexed(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[3] for row in cursor.fetchall()]
+        for step in plan:
+            self.assertNotIn('TEMP B-TREE', step, f"Sorts without an index:\n{sql}\n{plan}")
+            if step.startswith('SCAN'):
+                self.assertIn('INDEX', step, f"Full table scan:\n{sql}\n{plan}")
+
+    def assertPageIndexed(self, user, url, params=None, status=200, cold=True, **headers):
+        """Render `url` as `user` and check every query it ran."""
+        self.client.force_login(user)
+        if cold:
+            # Start cold, so the unread badge falls back to the database too
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {}, headers=headers)
+        self.assertEqual(response.status_code, status)
+        for query in ctx.captured_queries:
+            self.assertIndexed(query['sql'])
+        return response
+
+
+@skipUnless(connection.vendor == 'sqlite', "Reads SQLite's EXPLAIN QUERY PLAN output")
+@override_settings(JOB_QUEUE_EAGER=True, FEED_PAGE_SIZE=2, COMMENTS_PAGE_SIZE=1, REPLIES_PAGE_SIZE=1,
+                   FOLLOW_LIST_PAGE_SIZE=1)
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    """The hot pages must stay on their indexes."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        # Fan-out and notifications happen on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.reader)
+            self.client.post('/accounts/profile/author/toggle_follow/')
+
+            self.client.force_login(self.author)
+            for i in range(5):
+                self.client.post('/new/', {'content': f'post {i}'})
+            self.post = Post.objects.order_by('id').first()
+
+            self.client.force_login(self.reader)
+            self.client.post(f'/like/{self.post.id}/')
+            self.client.post(f'/comment/{self.post.id}/', {'text': 'top'})
+            self.top = Comment.objects.get()
+            self.client.post(f'/comment/{self.post.id}/', {'text': 'second'})
+            self.client.post(f'/comment/{self.post.id}/', {'text': 'reply', 'parent': self.top.id})
+            reply = Comment.objects.get(text='reply')
+            self.client.post(f'/comment/{self.post.id}/', {'text': 'nested', 'parent': reply.id})
+
+    def test_post_list(self):
+        response = self.assertPageIndexed(self.reader, '/feed/')
+        self.assertPageIndexed(self.reader, '/feed/', {'before': response.context['next_cursor']})
+        self.assertPageIndexed(self.reader, '/feed/page/', {'before': response.context['next_cursor']})
+
+    def test_following_feed(self):
+        response = self.assertPageIndexed(self.reader, '/following/')
+        self.assertPageIndexed(self.reader, '/following/', {'before': response.context['next_cursor']})
+
+    def test_view_profile(self):
+        self.assertPageIndexed(self.reader, '/accounts/profile/author/')
+
+    def test_follow_suggestions(self):
+        # Someone with followers, for the author to be pointed at
+        third = User.objects.create_user('third', 'third@example.com', 'pw')
+        graph.follow(self.reader.profile, third.profile)
+        for _ in graph.compute_suggestions():
+            pass
+        self.assertContains(self.assertPageIndexed(self.author, '/feed/'), 'Who to follow')
+        self.assertContains(self.assertPageIndexed(self.author, '/accounts/profile/author/'), 'Who to follow')
+
+    def test_follow_lists(self):
+        fan = User.objects.create_user('fan', 'fan@example.com', 'pw')
+        graph.follow(fan.profile, self.author.profile)
+        graph.follow(self.author.profile, fan.profile)
+        for url in ('/accounts/profile/author/followers/', '/accounts/profile/reader/following/'):
+            response = self.assertPageIndexed(self.reader, url)
+            if response.context['next_cursor']:
+                self.assertPageIndexed(self.reader, url, {'before': response.context['next_cursor']})
+
+    def test_comment_page(self):
+        response = self.assertPageIndexed(self.reader, f'/comment/add/{self.post.id}/')
+        self.assertPageIndexed(self.reader, f'/comment/add/{self.post.id}/', {'after': response.context['next_cursor']})
+
+    def test_comment_replies(self):
+        url = f'/comment/{self.top.id}/replies/'
+        response = self.assertPageIndexed(self.reader, url)
+        self.assertPageIndexed(self.reader, url, {'after': response.json()['next']})
+
+    def test_notification_list(self):
+        self.assertPageIndexed(self.author, '/notifications/list/')
+
+    def test_not_modified(self):
+        # A refresh of an unchanged page is answered from the etag queries
+        # alone, even after the cache was emptied
+        for user, url in [(self.reader, '/feed/'), (self.reader, '/following/'),
+                          (self.reader, '/accounts/profile/author/'), (self.author, '/notifications/list/')]:
+            self.client.force_login(user)
+            # The first view of the notifications marks them read
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.get(url)
+            etag = self.client.get(url)['ETag']
+            self.assertPageIndexed(user, url, status=304, if_none_match=etag)
+
+    def test_not_modified_own_like(self):
+        # The reader likes a post as someone else unlikes it: the count is
+        # back where it was but the reader's heart is not
+        other = User.objects.create_user('other', 'other@example.com', 'pw')
+        post = Post.objects.filter(owner=self.author).order_by('-id').first()
+        likes.set_like(post, other, True)
+        for url in ('/feed/', '/following/', '/accounts/profile/author/'):
+            with self.subTest(url=url):
+                self.client.force_login(self.reader)
+                # The first response sets the CSRF cookie
+                self.client.get(url)
+                etag = self.client.get(url)['ETag']
+                self.assertPageIndexed(self.reader, url, status=304, if_none_match=etag)
+                likes.set_like(post, self.reader, True)
+                likes.set_like(post, other, False)
+                self.assertPageIndexed(self.reader, url, if_none_match=etag)
+                likes.set_like(post, self.reader, False)
+                likes.set_like(post, other, True)
+
+    def test_unread_count(self):
+        # What the badge's context processor runs on a cache miss: one
+        # indexed read of the profile row, then none until it expires
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(unread_count(self.author.id), 3)
+            unread_count(self.author.id)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIndexed(ctx.captured_queries[0]['sql'])
+
+
+class CardCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.post = Post.objects.create(owner=self.user, content='hello')
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_changes_from_other_processes(self):
+        # An UPDATE the way run_worker or reconcile_counters would make it,
+        # with nothing in this process's cache told about it
+        first = self.client.get('/accounts/profile/author/')
+        self.assertContains(first, '0 likes')
+        Post.objects.filter(id=self.post.id).update(like_count=7, comment_count=2)
+        response = self.client.get('/accounts/profile/author/', headers={'if_none_match': first['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '7 likes')
+        self.assertContains(response, '2 comments')
+
+
+class PageETagTests(TestCase):
+
+    def test_new_csrf_secret(self):
+        # Logging in again rotates the CSRF secret, and a page kept from
+        # before would post forms with tokens for the old one
+        user = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.client.force_login(user)
+        url = '/accounts/profile/author/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if_none_match': etag}).status_code, 304)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 32
+        self.assertEqual(self.client.get(url, headers={'if_none_match': etag}).status_code, 200)
+
+
+@override_settings(LIKE_BATCH_MAX_OPS=3)
+class LikeTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        self.posts = [Post.objects.create(owner=self.author, content=f'post {i}') for i in range(2)]
+        self.client.force_login(self.reader)
+
+    def batch(self, *ops):
+        return self.client.post('/like/batch/', json.dumps({'ops': list(ops)}), content_type='application/json')
+
+    def like_count(self, post):
+        post.refresh_from_db()
+        return post.like_count
+
+    def test_toggle(self):
+        post = self.posts[0]
+        ajax = {'x_requested_with': 'XMLHttpRequest'}
+        self.assertEqual(self.client.post(f'/like/{post.id}/', headers=ajax).json(), {'liked': True, 'count': 1})
+        self.assertEqual(self.client.post(f'/like/{post.id}/', headers=ajax).json(), {'liked': False, 'count': 0})
+        self.assertEqual(self.client.post('/like/999/').status_code, 404)
+        self.assertFalse(post.likes.exists())
+
+    def test_batch_replay(self):
+        first, second = self.posts
+        ops = [{'post': first.id, 'liked': True}, {'post': second.id, 'liked': True}, {'post': second.id, 'liked': False}]
+        for _ in range(2):
+            response = self.batch(*ops)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], {
+                str(first.id): {'liked': True, 'count': 1}, str(second.id): {'liked': False, 'count': 0},
+            })
+        self.assertEqual((self.like_count(first), self.like_count(second)), (1, 0))
+        self.assertEqual(list(first.likes.all()), [self.reader])
+
+    def test_batch_unknown_posts(self):
+        response = self.batch({'post': self.posts[0].id, 'liked': True}, {'post': 999, 'liked': True})
+        self.assertEqual(response.json()['results'], {
+            str(self.posts[0].id): {'liked': True, 'count': 1}, '999': {'error': 'not found'},
+        })
+        self.assertEqual(self.like_count(self.posts[0]), 1)
+
+    def test_batch_other_likers(self):
+        self.client.force_login(self.author)
+        self.batch({'post': self.posts[0].id, 'liked': True})
+        self.client.force_login(self.reader)
+        response = self.batch({'post': self.posts[0].id, 'liked': True}, {'post': self.posts[0].id, 'liked': True})
+        self.assertEqual(response.json()['results'][str(self.posts[0].id)], {'liked': True, 'count': 2})
+        self.assertEqual(self.like_count(self.posts[0]), 2)
+
+    def test_batch_rejected(self):
+        post = self.posts[0].id
+        for body in (
+            {'ops': [{'post': post, 'liked': 'false'}]},
+            {'ops': [{'post': post, 'liked': 0}]},
+            {'ops': [{'post': post}]},
+            {'ops': [{'post': 'x', 'liked': True}]},
+            {'ops': [{'post': post, 'liked': True}] * 4},
+            {'nope': []},
+        ):
+            with self.subTest(body=body):
+                response = self.client.post('/like/batch/', json.dumps(body), content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post('/like/batch/', 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.like_count(self.posts[0]), 0)
+
+
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+        self.other = User.objects.create_user('other', 'other@example.com', 'pw')
+
+    def post_as(self, user, content):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/new/', {'content': content})
+        return Post.objects.get(content=content)
+
+    def toggle_follow(self, user, target):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/accounts/profile/{target.username}/toggle_follow/')
+
+    def timeline(self, user):
+        return set(TimelineEntry.objects.filter(user=user).values_list('post_id', flat=True))
+
+    def test_follow_post_unfollow(self):
+        before = self.post_as(self.author, 'before')
+        self.toggle_follow(self.reader, self.author)
+        # Following copies in what they posted already
+        self.assertEqual(self.timeline(self.reader), {before.id})
+        after = self.post_as(self.author, 'after')
+        self.assertEqual(self.timeline(self.reader), {before.id, after.id})
+        self.assertEqual(self.timeline(self.other), set())
+        self.client.force_login(self.reader)
+        self.assertEqual([p.id for p in self.client.get('/following/').context['posts']], [after.id, before.id])
+        self.toggle_follow(self.reader, self.author)
+        self.assertEqual(self.timeline(self.reader), set())
+
+    @override_settings(TIMELINE_SYNC_FANOUT_LIMIT=1)
+    def test_big_accounts_fan_out_in_a_job(self):
+        self.toggle_follow(self.reader, self.author)
+        self.toggle_follow(self.other, self.author)
+        post = self.post_as(self.author, 'hello')
+        self.assertEqual(TimelineEntry.objects.count(), 0)
+        # Follow notifications are queued too
+        [job] = [job for job in claim('test', 10) if job.name == 'viewpost.fan_out']
+        self.assertEqual(job.payload, {'post_id': post.id})
+        self.assertTrue(run(job))
+        self.assertEqual(self.timeline(self.reader), {post.id})
+        self.assertEqual(self.timeline(self.other), {post.id})
+
+    def test_rebuild(self):
+        self.toggle_follow(self.reader, self.author)
+        followed = {self.post_as(self.author, f'post {i}').id for i in range(3)}
+        stray = self.post_as(self.other, 'stray')
+        # Drift: an entry gone missing, and one from someone not followed
+        TimelineEntry.objects.filter(user=self.reader).order_by('post_id').first().delete()
+        TimelineEntry.objects.create(user=self.reader, post=stray, created_at=stray.created_at)
+        call_command('rebuild_timelines', 'reader', stdout=io.StringIO())
+        self.assertEqual(self.timeline(self.reader), followed)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pw')
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pw')
+
+    def as_user(self, user, url, data=None):
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data or {})
+
+    def assertNoDrift(self):
+        self.assertEqual((reconcile_posts(), reconcile_comments(), reconcile_profiles()), (0, 0, 0))
+
+    def test_views_keep_counters(self):
+        self.as_user(self.reader, '/accounts/profile/author/toggle_follow/')
+        self.as_user(self.author, '/accounts/profile/reader/toggle_follow/')
+        self.as_user(self.author, '/new/', {'content': 'kept'})
+        self.as_user(self.author, '/new/', {'content': 'deleted'})
+        kept, deleted = Post.objects.get(content='kept'), Post.objects.get(content='deleted')
+        for post in (kept, deleted):
+            self.as_user(self.reader, f'/like/{post.id}/')
+            self.as_user(self.reader, f'/comment/{post.id}/', {'text': 'top'})
+        top = Comment.objects.get(post=kept)
+        self.as_user(self.author, f'/comment/{kept.id}/', {'text': 'reply', 'parent': top.id})
+        reply = Comment.objects.get(text='reply')
+        self.as_user(self.reader, f'/comment/{kept.id}/', {'text': 'nested', 'parent': reply.id})
+        self.as_user(self.reader, f'/comment/{kept.id}/', {'text': 'other'})
+        self.assertNoDrift()
+
+        # Unlike, a reply deleted along with its own reply, a post, an unfollow
+        self.as_user(self.reader, f'/like/{kept.id}/')
+        self.as_user(self.author, f'/comment/{reply.id}/delete/')
+        self.as_user(self.author, f'/delete/{deleted.id}/')
+        self.as_user(self.author, '/accounts/profile/reader/toggle_follow/')
+        self.assertNoDrift()
+        kept.refresh_from_db()
+        top.refresh_from_db()
+        self.assertEqual((kept.like_count, kept.comment_count, top.reply_count), (0, 2, 0))
+        self.author.profile.refresh_from_db()
+        self.assertEqual((self.author.profile.posts_count, self.author.profile.followers_count,
+                          self.author.profile.following_count), (1, 1, 0))
+
+    def test_reconcile_command(self):
+        post = Post.objects.create(owner=self.author, content='hello')
+        likes.set_like(post, self.reader, True)
+        Post.objects.update(like_count=5, comment_count=3)
+        Profile.objects.filter(user=self.author).update(posts_count=0, followers_count=9)
+        out = io.StringIO()
+        call_command('reconcile_counters', '--sleep', '0', stdout=out)
+        self.assertIn('posts: repaired 1', out.getvalue())
+        self.assertIn('profiles: repaired 1', out.getvalue())
+        post.refresh_from_db()
+        self.author.profile.refresh_from_db()
+        self.assertEqual((post.like_count, post.comment_count), (1, 0))
+        self.assertEqual((self.author.profile.posts_count, self.author.profile.followers_count), (1, 0))
+        self.assertNoDrift()
+
+
+class ImageTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.user = User.objects.create_user('author', 'author@example.com', 'pw')
+        cache.clear()
+
+    def post_with_image(self, name, size):
+        png = io.BytesIO()
+        Image.new('RGB', size, 'red').save(png, 'PNG')
+        return Post.objects.create(owner=self.user, content=name, image=SimpleUploadedFile(name, png.getvalue()))
+
+    def test_variants(self):
+        big = self.post_with_image('big.png', (1600, 800))
+        small = self.post_with_image('small.png', (100, 50))
+        out = io.StringIO()
+        call_command('backfill_image_variants', stdout=out)
+        self.assertIn('Done: 2 rendered, 0 failed.', out.getvalue())
+
+        big.refresh_from_db()
+        self.assertEqual(big.image_variants, {
+            'thumb': {'width': 400, 'height': 200,
+                      'jpeg': 'post_images/big.thumb.jpg', 'webp': 'post_images/big.thumb.webp'},
+            'detail': {'width': 1200, 'height': 600,
+                       'jpeg': 'post_images/big.detail.jpg', 'webp': 'post_images/big.detail.webp'},
+        })
+        for variant in big.image_variants.values():
+            for key in ('jpeg', 'webp'):
+                with default_storage.open(variant[key]) as f, Image.open(f) as image:
+                    self.assertEqual(image.size, (variant['width'], variant['height']))
+        # Never upscaled
+        small.refresh_from_db()
+        self.assertEqual({(v['width'], v['height']) for v in small.image_variants.values()}, {(100, 50)})
+
+    def test_markup(self):
+        post = self.post_with_image('cat.png', (800, 600))
+        self.client.force_login(self.user)
+        # Before the copies exist, the original
+        self.assertContains(self.client.get('/accounts/profile/author/'), f'src="{post.image.url}"')
+        images.generate(post)
+        response = self.client.get('/accounts/profile/author/')
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, 'srcset="/media/post_images/cat.thumb.webp 400w, '
+                                      '/media/post_images/cat.detail.webp 800w"')
+        self.assertContains(response, 'src="/media/post_images/cat.thumb.jpg"')
+        self.assertContains(response, 'width="400" height="300"')
@@ -0,0 +1,32 @@
+"""
+Comment threads, a page at a time.
+
+The comment page only shows a page of top-level comments; each one's
+replies stay collapsed behind its reply_count until the reader asks for
+them, so first paint costs the same however big the discussion gets.
+"""
+from django.conf import settings
+
+from .pagination import keyset_page
+
+
+def top_level_page(post, cursor=None):
+    """(comments, next_cursor) for one page of `post`'s top-level comments, oldest first."""
+    comments = post.comments.filter(parent=None).select_related('author')
+    return keyset_page(comments, cursor, size=settings.COMMENTS_PAGE_SIZE, field='date_added', descending=False)
+
+
+def replies_page(comment, cursor=None):
+    """
+    (replies, next_cursor) for one page of every reply under `comment`.
+
+    Replies come in path order, so each one follows its parent and the
+    pages can simply be appended to each other. `.indent` is how many
+    levels below `comment` a reply sits.
+    """
+    replies, next_cursor = keyset_page(
+        comment.descendants().select_related('author'), cursor,
+        size=settings.REPLIES_PAGE_SIZE, field='path', descending=False)
+    for reply in replies:
+        reply.indent = reply.depth - comment.depth - 1
+    return replies, next_cursor
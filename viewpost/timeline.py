@@ -0,0 +1,71 @@
+"""
+Fan-out-on-write home timelines.
+
+Every new post is copied into a TimelineEntry row for each follower of its
+owner, so the following feed is a single (user, created_at) index range
+instead of an owner__in=... scan over the whole Post table.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from accounts.models import Profile
+from jobqueue.queue import enqueue
+from .models import Post, TimelineEntry
+from .utils import chunked
+
+Follow = Profile.following.through
+
+
+def follower_ids(user_id):
+    """User ids of everyone following `user_id`."""
+    return Follow.objects.filter(to_profile__user_id=user_id).values_list('from_profile__user_id', flat=True)
+
+
+def fan_out(post):
+    """Insert `post` into every follower's timeline, a batch at a time."""
+    ids = follower_ids(post.owner_id).iterator(chunk_size=settings.TIMELINE_FANOUT_BATCH_SIZE)
+    for batch in chunked(ids, settings.TIMELINE_FANOUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user_id=uid, post=post, created_at=post.created_at) for uid in batch],
+            ignore_conflicts=True,
+        )
+
+
+def schedule_fan_out(post):
+    """
+    Fan `post` out once the transaction that created it commits. Accounts
+    with lots of followers are handed to the job queue so the request
+    that wrote the post doesn't wait for thousands of inserts.
+    """
+    if follower_ids(post.owner_id).count() > settings.TIMELINE_SYNC_FANOUT_LIMIT:
+        enqueue('viewpost.fan_out', post_id=post.id)
+    else:
+        transaction.on_commit(lambda: fan_out(post))
+
+
+def backfill(user, followee):
+    """Copy `followee`'s most recent posts into `user`'s timeline after a follow."""
+    recent = Post.objects.filter(owner=followee).order_by('-created_at')
+    recent = recent.values_list('id', 'created_at')[:settings.TIMELINE_BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=user, post_id=pid, created_at=created) for pid, created in recent],
+        ignore_conflicts=True,
+    )
+
+
+def purge(user, followee):
+    """Drop `followee`'s posts from `user`'s timeline after an unfollow."""
+    TimelineEntry.objects.filter(user=user, post__owner=followee).delete()
+
+
+def rebuild(user):
+    """Throw away `user`'s timeline and rebuild it from who they follow now."""
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        followees = user.profile.following.values_list('user_id', flat=True)
+        posts = Post.objects.filter(owner__in=followees).values_list('id', 'created_at')
+        for batch in chunked(posts.iterator(chunk_size=batch_size), batch_size):
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user=user, post_id=pid, created_at=created) for pid, created in batch]
+            )
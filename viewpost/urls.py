@@ -5,15 +5,19 @@ app_name = 'viewpost'
 urlpatterns = [
     path('', views.index, name='index'),
     path('feed/', views.post_list, name='post_list'),
+    path('feed/page/', views.feed_page, name='feed_page'),
     path('new/', views.new_post, name='new_post'),
     path('delete/<int:post_id>/', views.delete_post, name='delete_post'),
     path('like/<int:post_id>/', views.like_post, name='like_post'),
+    path('like/batch/', views.like_batch, name='like_batch'),
     
     # Comments
     path('comment/<int:post_id>/', views.add_comment, name='add_comment'),
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
+    path('comment/<int:comment_id>/replies/', views.comment_replies, name='comment_replies'),
 
     path('comment/add/<int:post_id>/', views.comment_page, name='comment_page'),
     path('following/', views.following_feed, name='following'),
+    path('search/', views.search_posts, name='search'),
     
 ]
\ No newline at end of file
@@ -0,0 +1,8 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items, for batched inserts/updates."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
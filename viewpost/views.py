@@ -1,23 +1,60 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from . models import Post, Comment
+from . models import Post, Comment, TimelineEntry
 from .forms import PostForm, CommentForm
-from notifications.models import Notification
-from django.contrib.contenttypes.models import ContentType
+from notifications.tasks import notify_later
+from jobqueue.queue import enqueue
 from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from django.template.loader import render_to_string
+from django.conf import settings
+from django.db import transaction
+from accounts import graph
+from accounts.models import Profile
+from .conditional import page_etag
+from .pagination import keyset_page
+from .counters import bump
+from .likes import Like, set_like, toggle_like
+from .threads import replies_page, top_level_page
+from . import cards, search, timeline
+
+def _feed_page(request, posts):
+    """One page of the main feed out of `posts`, starting after the ?before= cursor."""
+    # Exclude the logged-in user's posts
+    posts = posts.exclude(owner=request.user)
+    return keyset_page(posts, request.GET.get('before'), size=settings.FEED_PAGE_SIZE)
+
+def _feed_etag(request):
+    posts, _ = _feed_page(request, Post.objects.for_etag())
+    suggestions = graph.suggestion_ids(request.user.profile)
+    return page_etag(request, cards.watermark(posts, request.user), *suggestions)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_feed_etag)
 def post_list(request):
     """
     Shows all posts EXCEPT the ones the current user made.
     User's own posts should only appear on their profile page.
     """
-    # Exclude the logged-in user's posts
-    posts = Post.objects.exclude(owner=request.user).order_by('-created_at')
+    posts, next_cursor = _feed_page(request, Post.objects.for_feed(request.user))
     comment_form = CommentForm()
-    context = {'posts': posts, 'comment_form': comment_form, }
+    context = {
+        'posts': posts, 'next_cursor': next_cursor, 'comment_form': comment_form,
+        'suggestions': graph.suggestions_for(request.user.profile),
+    }
     return render(request, 'viewpost/post_list.html', context)
 
+@login_required
+def feed_page(request):
+    """Next page of the main feed as an HTML fragment, for infinite scroll."""
+    posts, next_cursor = _feed_page(request, Post.objects.for_feed(request.user))
+    html = render_to_string('viewpost/post_cards.html', {'posts': posts}, request=request)
+    return JsonResponse({'html': html, 'next': next_cursor})
+
 # for anonymous visitors to see all public posts
 # def post_list(request):
 #     if request.user.is_authenticated:
@@ -34,7 +71,13 @@ def new_post(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.owner = request.user
-            post.save()
+            with transaction.atomic():
+                post.save()
+                bump(Profile.objects.filter(user=request.user), 'posts_count')
+                timeline.schedule_fan_out(post)
+                if post.image:
+                    # Feed-sized copies get rendered off the request path
+                    enqueue('viewpost.render_image', post_id=post.id)
             return redirect('viewpost:post_list')
     else:
         form = PostForm()
@@ -45,113 +88,157 @@ def delete_post(request, post_id):
     """Delete an existing post."""
     post = get_object_or_404(Post, id=post_id, owner=request.user)
     if request.method == 'POST':
-        post.delete()
+        with transaction.atomic():
+            post.delete()
+            bump(Profile.objects.filter(user=request.user), 'posts_count', -1)
         return redirect('accounts:profile', username=request.user.username)
     return render(request, 'viewpost/confirm_delete.html', {'post': post})
 
 @login_required
 def like_post(request, post_id):
     """"Like an existing post."""
-    post = get_object_or_404(Post, id=post_id)
-    user = request.user
-    if user in post.likes.all():
-        post.likes.remove(user)
-        liked = False
-    else:
-        post.likes.add(user)
-        liked = True
-        # Create a notification but don't notify urself
-        if post.owner != user:
-            Notification.objects.create(
-                recipient=post.owner,
-                actor=user,
-                verb='liked your post',
-                target_ct=ContentType.objects.get_for_model(Post),
-                target_id=post.id
-            )
-    count = post.likes.count()
+    post = get_object_or_404(Post.objects.only('id', 'owner_id'), id=post_id)
+    liked = toggle_like(post, request.user)
     # If this is an Ajax request, return JSON
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        count = Post.objects.values_list('like_count', flat=True).get(id=post.id)
         return JsonResponse({'liked': liked, 'count': count})
 
     # Redirect back to whatever page you were on
     return redirect(request.META.get('HTTP_REFERER', 'viewpost:post_list'))
 
+@login_required
+@require_POST
+def like_batch(request):
+    """
+    Apply several like/unlike operations at once, for clients that queue
+    them up offline. Expects {"ops": [{"post": 1, "liked": true}, ...]};
+    each op is idempotent, so replaying a queue is harmless.
+    """
+    try:
+        ops = json.loads(request.body)['ops']
+        ops = [(int(op['post']), op['liked']) for op in ops]
+        # Only real booleans, bool("false") would be a like
+        if not all(isinstance(liked, bool) for _, liked in ops):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"ops": [{"post": <id>, "liked": <bool>}, ...]}'}, status=400)
+    if len(ops) > settings.LIKE_BATCH_MAX_OPS:
+        return JsonResponse({'error': f'At most {settings.LIKE_BATCH_MAX_OPS} ops per batch'}, status=400)
+
+    posts = Post.objects.only('id', 'owner_id').in_bulk({post_id for post_id, _ in ops})
+    with transaction.atomic():
+        for post_id, liked in ops:
+            if post_id in posts:
+                set_like(posts[post_id], request.user, liked)
+
+    # Report the final state of every post touched, in one query each
+    counts = dict(Post.objects.filter(id__in=posts).values_list('id', 'like_count'))
+    liked_ids = set(Like.objects.filter(post_id__in=posts, user=request.user).values_list('post_id', flat=True))
+    results = {
+        post_id: {'liked': post_id in liked_ids, 'count': counts[post_id]} if post_id in posts else {'error': 'not found'}
+        for post_id, _ in ops
+    }
+    return JsonResponse({'results': results})
+
+def _save_comment(request, post, form):
+    """Save a valid CommentForm as a comment (or reply) on `post`. False if the parent is bogus."""
+    comment = form.save(commit=False)
+    # handling threading: the form already set comment.parent
+    if comment.parent and comment.parent.post_id != post.id:
+        form.add_error('parent', "That comment belongs to another post.")
+        return False
+    comment.post = post
+    comment.author = request.user
+    with transaction.atomic():
+        comment.save()
+        bump(Post.objects.filter(id=post.id), 'comment_count')
+        bump(Comment.objects.filter(id__in=comment.ancestor_ids), 'reply_count')
+        # Notify post owner (unless they commented on their on post)
+        if post.owner_id != request.user.id:
+            notify_later(post.owner_id, request.user, 'commented on your post', target=post)
+    return True
+
+def _render_comment_page(request, post, form):
+    # Replies stay collapsed, comment_replies fetches them on demand
+    top_comments, next_cursor = top_level_page(post, request.GET.get('after'))
+    context = {'post': post, 'form': form, 'top_comments': top_comments, 'next_cursor': next_cursor}
+    return render(request, 'viewpost/comment_page.html', context)
+
 @login_required
 def add_comment(request, post_id):
     """Add a Comment on existing post."""
     post = get_object_or_404(Post, id=post_id) 
-    user = request.user
     if request.method == 'POST':
         form = CommentForm(request.POST)
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.post = post
-            comment.author = user
-            comment.save()
-            # Notify post owner (unless they commented on their on post)
-            if post.owner != user:
-                Notification.objects.create(
-                    recipient=post.owner,
-                    actor=user,
-                    verb='commented on your post',
-                    target_ct=ContentType.objects.get_for_model(Post),
-                    target_id=post.id)
+        if form.is_valid() and _save_comment(request, post, form):
             return redirect(request.META.get('HTTP_REFERER', 'viewpost:post_list'))
-            
     else:
         form = CommentForm()
-    return render(request, 'viewpost/comment_page.html', {'post': post, 'form': form,})
+    return _render_comment_page(request, post, form)
 
 @login_required
 def delete_comment(request, comment_id):
     """Delete an existing comment."""
     comment = get_object_or_404(Comment, id=comment_id, author=request.user)
     if request.method == 'POST':
-        comment.delete()
+        with transaction.atomic():
+            # Replies go with it, so count everything the cascade removed
+            _, deleted = comment.delete()
+            removed = deleted.get('viewpost.Comment', 0)
+            bump(Post.objects.filter(id=comment.post_id), 'comment_count', -removed)
+            bump(Comment.objects.filter(id__in=comment.ancestor_ids), 'reply_count', -removed)
     return redirect('viewpost:post_list')
 
 @login_required
 def comment_page(request, post_id):
-    """Show a form to add a comment to post"""
-    post = get_object_or_404(Post, id=post_id)
-    user = request.user
-    top_comments = post.comments.filter(parent__isnull=True)
+    """A page of a post's top-level comments (replies load on demand from comment_replies) and a form to add one"""
+    post = get_object_or_404(Post.objects.select_related('owner__profile'), id=post_id)
     if request.method == 'POST':
         form = CommentForm(request.POST)
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.post = post
-            comment.author = request.user
-            comment.save()
-            # handling threading.........
-            parent_id = form.cleaned_data.get('parent')
-            if parent_id:
-                comment.parent = Comment.objects.get(id=parent_id)
-            comment.save()
-            
-            # Notify post owner, except if they commented on their on post
-            if post.owner != user:
-                Notification.objects.create(
-                    recipient=post.owner,
-                    actor=user,
-                    verb='commented on your post',
-                    target_ct=ContentType.objects.get_for_model(Post),
-                    target_id=post.id)
+        if form.is_valid() and _save_comment(request, post, form):
             return redirect(request.META.get('HTTP_REFERER', 'viewpost:post_list'))
     else:
         form = CommentForm()
-    top_comments = post.comments.filter(parent__isnull=True).order_by('date_added')
-    return render(request, 'viewpost/comment_page.html', {'post': post, 'form': form, 'top_comments': top_comments})
+    return _render_comment_page(request, post, form)
 
 @login_required
+def comment_replies(request, comment_id):
+    """Next page of a collapsed reply branch as an HTML fragment."""
+    comment = get_object_or_404(Comment.objects.only('id', 'post_id', 'path', 'depth'), id=comment_id)
+    replies, next_cursor = replies_page(comment, request.GET.get('after'))
+    html = render_to_string('viewpost/comment_replies.html', {'replies': replies}, request=request)
+    return JsonResponse({'html': html, 'next': next_cursor})
+
+def _timeline_page(request, posts):
+    """(posts, next_cursor) for one page of the user's following timeline, loaded from `posts`."""
+    # Posts were already fanned out into our timeline, so this is one index range
+    entries, next_cursor = keyset_page(
+        TimelineEntry.objects.filter(user=request.user), request.GET.get('before'),
+        size=settings.FEED_PAGE_SIZE, tiebreak='post_id')
+    found = posts.order_by().in_bulk([e.post_id for e in entries])
+    return [found[e.post_id] for e in entries if e.post_id in found], next_cursor
+
+def _following_etag(request):
+    posts, _ = _timeline_page(request, Post.objects.for_etag())
+    return page_etag(request, cards.watermark(posts, request.user))
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_following_etag)
 def following_feed(request):
     """Show posts posted by users that the current user follows."""
-    # get the User objects you follow
-    followees = request.user.profile.following.values_list('user', flat=True)
-    posts = Post.objects.filter(owner__in=followees) \
-                            .order_by('-created_at')
-    return render(request, 'viewpost/following.html', {'posts': posts})
+    posts, next_cursor = _timeline_page(request, Post.objects.for_feed(request.user))
+    return render(request, 'viewpost/following.html', {'posts': posts, 'next_cursor': next_cursor})
+
+@login_required
+def search_posts(request):
+    """Search post content, best match first, shown as feed cards."""
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = [], None
+    if query:
+        posts, next_cursor = search.search(Post.objects.for_feed(request.user), query, request.GET.get('after'))
+    return render(request, 'viewpost/search.html', {'query': query, 'posts': posts, 'next_cursor': next_cursor})
 
 def index(request):
     return render(request, 'viewpost/index.html')
@@ -0,0 +1,142 @@
+"""
+Serving uploaded media.
+
+serve_media() answers conditional requests with 304 (ETag and
+Last-Modified), serves single byte ranges with 206, and marks
+content-addressed files (the hashed avatar renders) as cacheable forever.
+
+With MEDIA_ACCEL_REDIRECT set, the body is left to the front proxy:
+'nginx' answers with an X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path,
+which must be an `internal` location aliased to MEDIA_ROOT, and
+'sendfile' answers with X-Sendfile and the file's absolute path (Apache
+mod_xsendfile, lighttpd). The proxy then handles ranges itself, and no
+Python worker ever streams image bytes.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# A 64 hex digit SHA-256 in the name means the content can never change
+HASHED_NAME = re.compile(r'(^|/)[0-9a-f]{64}[^/]*$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def _byte_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header, None to send
+    the whole file, or False when the range can't be satisfied.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    # Multiple ranges or another unit: RFC 9110 lets us send it all instead
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range, the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        if size == 0:
+            # No last byte to point at, send the (empty) whole
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_passes(request, etag, last_modified):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _stream(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404("Not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Not found")
+
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+    content_type, encoding = mimetypes.guess_type(full_path)
+    # Never let an upload be taken for HTML, like django.views.static.serve
+    content_type = content_type or 'application/octet-stream'
+
+    # Headers every answer carries, the 304 included
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    if HASHED_NAME.search(path):
+        headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        headers['Cache-Control'] = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+    conditional = get_conditional_response(request, etag, last_modified, headers)
+    if conditional is not headers:
+        return conditional
+
+    mode = settings.MEDIA_ACCEL_REDIRECT
+    if mode == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.MEDIA_ACCEL_PREFIX + path)
+    elif mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        byte_range = None
+        if 'Range' in request.headers and _if_range_passes(request, etag, last_modified):
+            byte_range = _byte_range(request.headers['Range'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+        response = StreamingHttpResponse(_stream(full_path, start, length), content_type=content_type)
+        response['Content-Length'] = str(length)
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Accept-Ranges'] = 'bytes'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for name, value in headers.items():
+        if name != 'Content-Type':
+            response[name] = value
+    return response
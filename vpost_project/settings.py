@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
     'viewpost',
     'accounts',
     'notifications',
+    'jobqueue',
+    'outbox',
     'django_bootstrap5',
     'django.contrib.humanize',
     'schema_viewer',
@@ -138,23 +141,102 @@ LOGIN_REDIRECT_URL = 'viewpost:post_list'
 LOGOUT_REDIRECT_URL = 'viewpost:index'
 LOGIN_URL = 'accounts:login'
 
-# Authenticate user by either email or username
+# How many posts a feed page shows before "Load more"
+FEED_PAGE_SIZE = 20
+
+# Top-level comments per comment page, and replies per "Show replies" fetch
+COMMENTS_PAGE_SIZE = 20
+REPLIES_PAGE_SIZE = 20
+
+# Following feed timelines (see viewpost/timeline.py)
+TIMELINE_FANOUT_BATCH_SIZE = 500
+# Accounts with more followers than this fan out from the job queue
+TIMELINE_SYNC_FANOUT_LIMIT = 1000
+# How many of a user's recent posts land in your timeline when you follow them
+TIMELINE_BACKFILL_LIMIT = 200
+
+# Most like/unlike operations one /like/batch/ request may carry
+LIKE_BATCH_MAX_OPS = 100
+
+# Likes/comments/follows on the same thing within this window share one notification
+NOTIFICATION_GROUP_WINDOW = timedelta(days=1)
+NOTIFICATIONS_PAGE_SIZE = 30
+# prune_notifications deletes read notifications older than this
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Background jobs (jobqueue app), run `python manage.py run_worker` next to the server
+JOB_MAX_ATTEMPTS = 5
+# First retry waits this long, doubling each time after that
+JOB_RETRY_BACKOFF = timedelta(seconds=30)
+# A running job whose worker hasn't finished it in this long is handed out again
+JOB_LOCK_TIMEOUT = timedelta(minutes=10)
+# Run jobs in-process right after commit instead of queueing them (handy for tests)
+JOB_QUEUE_EAGER = False
+
+# Outgoing email (outbox app), run `python manage.py send_outbox` next to the worker
+OUTBOX_MAX_ATTEMPTS = 5
+# First retry waits this long, doubling each time after that
+OUTBOX_RETRY_BACKOFF = timedelta(minutes=1)
+# An email claimed this long ago and still not sent is handed out again
+OUTBOX_LOCK_TIMEOUT = timedelta(minutes=10)
+# Most emails sent per second, None for no cap
+OUTBOX_RATE_LIMIT = None
+
+# The default per-process cache is fine for one process. Once the server runs
+# several processes (or next to run_worker) point this at a shared backend,
+# e.g. FileBasedCache or memcached, so they all see the same counts and cards.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # Room for a few pages' worth of post card fragments
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+# Rendered post cards are kept this long, see viewpost/cards.py
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Upper bound on how stale a cached unread badge can get
+UNREAD_COUNT_CACHE_TIMEOUT = 60
+
+# Search results per page, and username suggestions per autocomplete keystroke
+USER_SEARCH_PAGE_SIZE = 20
+USER_AUTOCOMPLETE_LIMIT = 8
+POST_SEARCH_PAGE_SIZE = 20
+
+# "Who to follow": stored per user by compute_follow_suggestions, and shown on a page
+FOLLOW_SUGGESTIONS_LIMIT = 20
+FOLLOW_SUGGESTIONS_SHOWN = 5
+# Followers/following list rows per page
+FOLLOW_LIST_PAGE_SIZE = 50
+
+# Authenticate user by either email or username. Only the one backend,
+# so a failed login isn't looked up a second time.
 AUTHENTICATION_BACKENDS = [
     'accounts.backends.EmailOrUsernameModelBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Processes rendering resized post images, see viewpost/images.py
+IMAGE_PROCESS_WORKERS = 2
+
 # Where uploaded files will live on
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Browser cache lifetime for media without a content hash in the name
+MEDIA_CACHE_MAX_AGE = 60 * 60
+# Let the front proxy send media bodies: None, 'nginx' (X-Accel-Redirect) or 'sendfile' (X-Sendfile)
+MEDIA_ACCEL_REDIRECT = None
+# nginx `internal` location aliased to MEDIA_ROOT, for the 'nginx' mode
+MEDIA_ACCEL_PREFIX = '/protected-media/'
 DEBUG = True
 
-# prints emails to console (for dev)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Mail is queued in the outbox, send_outbox delivers it with OUTBOX_EMAIL_BACKEND
+EMAIL_BACKEND = 'outbox.backends.OutboxBackend'
+# prints emails to console (for dev). For a local SMTP server, try
+# `python -m aiosmtpd -n -l localhost:1025` with the smtp backend and EMAIL_PORT = 1025
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'no-reply@viewpost.local'
 
 # In production, switch to SMTP (having some issues, not working yet)
-# EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 # EMAIL_HOST = 'smtp.gmail.com'
 # EMAIL_PORT = 587
 # EMAIL_USE_TLS = True
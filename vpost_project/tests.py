@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from .media import _byte_range
+
+
+class ByteRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = [
+            ('bytes=0-3', 10, (0, 3)),
+            ('bytes=4-', 10, (4, 9)),
+            ('bytes=8-20', 10, (8, 9)),
+            ('bytes=-3', 10, (7, 9)),
+            ('bytes=-20', 10, (0, 9)),
+            ('bytes=10-', 10, False),
+            ('bytes=5-2', 10, False),
+            ('bytes=-0', 10, False),
+            ('bytes=0-', 0, False),
+            ('bytes=-5', 0, None),
+            ('bytes=0-1,4-5', 10, None),
+            ('bytes=-', 10, None),
+            ('lines=0-1', 10, None),
+        ]
+        for header, size, expected in cases:
+            with self.subTest(header=header, size=size):
+                self.assertEqual(_byte_range(header, size), expected)
+
+
+class ServeMediaTests(SimpleTestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media, MEDIA_ACCEL_REDIRECT=None))
+        Path(media, 'file.txt').write_bytes(b'0123456789')
+        Path(media, 'empty.txt').write_bytes(b'')
+
+    def get(self, path, **headers):
+        response = self.client.get(f'/media/{path}', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get('file.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response, body = self.get('file.txt', range='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertEqual(response['Content-Length'], '3')
+
+    def test_suffix_range(self):
+        response, body = self.get('file.txt', range='bytes=-3')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, b'789')
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+
+    def test_unsatisfiable(self):
+        response, _ = self.get('file.txt', range='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_multiple_ranges(self):
+        response, body = self.get('file.txt', range='bytes=0-1,4-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'0123456789')
+
+    def test_empty_file(self):
+        response, body = self.get('empty.txt', range='bytes=-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b'')
+        self.assertNotIn('Content-Range', response)
+
+    def test_if_range(self):
+        etag = self.get('file.txt')[0]['ETag']
+        self.assertEqual(self.get('file.txt', range='bytes=2-4', if_range=etag)[0].status_code, 206)
+        self.assertEqual(self.get('file.txt', range='bytes=2-4', if_range='"stale"')[0].status_code, 200)
+
+    def test_unknown_type(self):
+        Path(settings.MEDIA_ROOT, 'x.unknownext').write_bytes(b'<script>alert(1)</script>')
+        for mode in (None, 'nginx', 'sendfile'):
+            with self.subTest(mode=mode), override_settings(MEDIA_ACCEL_REDIRECT=mode):
+                response, _ = self.get('x.unknownext')
+                self.assertEqual(response['Content-Type'], 'application/octet-stream')
+
+    def test_not_modified(self):
+        first, _ = self.get('file.txt')
+        response, _ = self.get('file.txt', if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        response, _ = self.get('file.txt', if_modified_since=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)